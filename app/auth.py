@@ -3,7 +3,11 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +18,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow (~0.1-0.3 s); cap how many run at once, queue the rest
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -27,6 +34,70 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    Chạy bcrypt trong threadpool riêng (bcrypt nhả GIL) với số luồng giới hạn,
+    để đợt đăng nhập dồn dập chỉ phải xếp hàng chứ không làm treo event loop.
+    Ghi nhận số yêu cầu đang chờ/đang chạy và thời gian chờ để theo dõi.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS):
+        self.workers = max(workers, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _run(self, fn, enqueued_at: float, *args):
+        started = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            wait = started - enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_run += time.monotonic() - started
+
+    async def submit(self, fn, *args):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, fn, time.monotonic(), *args)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait / completed * 1000, 1),
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "avg_run_ms": round(self.total_run / completed * 1000, 1)
+            }
+
+password_hasher = PasswordHasher()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.submit(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.submit(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,197 @@
+"""
+Nén phản hồi HTTP (brotli hoặc gzip) theo header Accept-Encoding của trình duyệt.
+
+Chỉ nén phản hồi dạng văn bản (JSON, HTML, CSS, JS, CSV, NDJSON, ...) có kích thước
+từ COMPRESSION_MIN_BYTES trở lên. File tải về (/api/download, hỗ trợ Range), phản hồi
+206/304 và phản hồi đã được mã hóa sẵn được gửi nguyên. Phản hồi dạng stream được
+nén dần theo từng khối. Khi nén, ETag được đổi thành ETag yếu (W/"...") vì byte gửi
+đi khác với bản gốc; so sánh If-None-Match trong app/http_cache.py là so sánh yếu.
+
+Brotli cần gói `brotli`; nếu chưa cài thì chỉ dùng gzip.
+
+    COMPRESSION_MIN_BYTES=1024
+    COMPRESSION_GZIP_LEVEL=6
+    COMPRESSION_BROTLI_QUALITY=4
+"""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml"
+)
+EXCLUDED_PATHS = ("/api/download/",)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Chọn "br" hoặc "gzip" theo Accept-Encoding (có xét q=0); None nếu không dùng được cách nào."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class _GzipCompressor:
+    def __init__(self):
+        # wbits=31: định dạng gzip
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+def make_compressor(encoding: str):
+    return _BrotliCompressor() if encoding == "br" else _GzipCompressor()
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    compressor = make_compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        exclude_paths: Tuple[str, ...] = EXCLUDED_PATHS
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    """Giữ lại message bắt đầu phản hồi cho tới khối body đầu tiên để quyết định có nén hay không."""
+
+    def __init__(self, send: Send, encoding: Optional[str], minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            await self._start(message)
+            return
+
+        if self.start_message is None:
+            # Message trước phần bắt đầu phản hồi (vd. http.response.debug của TestClient)
+            await self._send(message)
+            return
+        if not self.passthrough and message["type"] != "http.response.body":
+            # vd. http.response.zerocopysend: không nén được
+            await self._pass_through()
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                await self._pass_through()
+                await self._send(message)
+                return
+
+            self.compressor = make_compressor(self.encoding)
+            data = self.compressor.compress(body)
+            if not more_body:
+                data += self.compressor.finish()
+            self._mark_compressed(None if more_body else len(data))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _start(self, message: Message):
+        message["headers"] = list(message.get("headers", []))
+        self.start_message = message
+        headers = MutableHeaders(raw=message["headers"])
+
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        eligible = (
+            content_type.startswith(COMPRESSIBLE_TYPES)
+            and message["status"] not in (204, 206, 304)
+            and "content-encoding" not in headers
+            and "content-range" not in headers
+        )
+        if eligible:
+            headers.add_vary_header("Accept-Encoding")
+        if not eligible or self.encoding is None:
+            await self._pass_through()
+
+    async def _pass_through(self):
+        if not self.passthrough:
+            self.passthrough = True
+            await self._send(self.start_message)
+
+    def _mark_compressed(self, content_length: Optional[int]):
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
@@ -0,0 +1,200 @@
+"""
+Bộ đếm thống kê cho dashboard.
+
+Thay vì đếm lại toàn bộ bảng ở mỗi lần tải dashboard, các bộ đếm trong bảng
+stat_counters được cộng/trừ ngay trong transaction tạo/xóa học liệu và người dùng:
+
+    materials                 ""            Tổng số học liệu
+    materials_by_day          "2024-05-01"  Số học liệu đăng trong ngày
+    materials_by_uploader     "<user id>"   Số học liệu theo người đăng
+    materials_by_department   "<khoa id>"   Số học liệu theo khoa
+    users / departments       ""            Tổng số người dùng / khoa
+
+Ngoài ra catalog_version tăng sau mỗi thao tác ghi làm thay đổi dữ liệu mà các API
+đọc trả về (học liệu, khoa, người dùng, nội dung đã đánh chỉ mục); ETag của các API
+đọc được tính từ số này (xem app/http_cache.py). Lượt tải file không làm tăng phiên
+bản: download_count trong các payload đã cache có thể cũ cho tới lần ghi kế tiếp.
+
+Các biểu đồ theo thời gian dùng bảng tổng hợp theo ngày material_daily_stats, được
+cập nhật cùng lúc với các bộ đếm học liệu (xem app/daily_stats.py).
+
+Payload dashboard tính từ các bộ đếm được cache thêm DASHBOARD_CACHE_SECONDS giây
+và bị xóa ngay khi một transaction có thay đổi bộ đếm được commit.
+`python manage.py rebuild-counters` tính lại toàn bộ từ dữ liệu gốc.
+"""
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.models.models import StatCounter, Material, User, Department
+from app import daily_stats
+import os
+import threading
+import time
+
+load_dotenv()
+
+DASHBOARD_CACHE_SECONDS = float(os.getenv("DASHBOARD_CACHE_SECONDS", "30"))
+
+MATERIALS = "materials"
+MATERIALS_BY_DAY = "materials_by_day"
+MATERIALS_BY_UPLOADER = "materials_by_uploader"
+MATERIALS_BY_DEPARTMENT = "materials_by_department"
+USERS = "users"
+DEPARTMENTS = "departments"
+CATALOG_VERSION = "catalog_version"
+
+def bump(db: Session, name: str, bucket: str = "", delta: int = 1):
+    """Cộng delta vào bộ đếm (tạo nếu chưa có). Không commit."""
+    updated = db.query(StatCounter).filter(
+        StatCounter.name == name,
+        StatCounter.bucket == bucket
+    ).update({StatCounter.value: StatCounter.value + delta}, synchronize_session=False)
+
+    if not updated:
+        db.add(StatCounter(name=name, bucket=bucket, value=delta))
+        db.flush()
+
+    db.info["stat_counters_changed"] = True
+
+def _day_bucket(created_at: Optional[datetime]) -> str:
+    return (created_at or datetime.utcnow()).date().isoformat()
+
+def _material_buckets(material: Material) -> List[Tuple[str, str]]:
+    return [
+        (MATERIALS, ""),
+        (MATERIALS_BY_DAY, _day_bucket(material.created_at)),
+        (MATERIALS_BY_UPLOADER, str(material.uploader_id)),
+        (MATERIALS_BY_DEPARTMENT, str(material.department_id))
+    ]
+
+def material_created(db: Session, material: Material):
+    """Gọi sau khi flush học liệu mới (cần created_at và danh sách file). Không commit."""
+    for name, bucket in _material_buckets(material):
+        bump(db, name, bucket, 1)
+    daily_stats.material_created(db, material)
+
+def material_deleted(db: Session, material: Material):
+    for name, bucket in _material_buckets(material):
+        bump(db, name, bucket, -1)
+    daily_stats.material_deleted(db, material)
+
+def material_moved(db: Session, material: Material, new_department_id: int):
+    """Học liệu được chuyển sang khoa khác (gọi trước khi đổi department_id)."""
+    if material.department_id == new_department_id:
+        return
+    bump(db, MATERIALS_BY_DEPARTMENT, str(material.department_id), -1)
+    bump(db, MATERIALS_BY_DEPARTMENT, str(new_department_id), 1)
+    daily_stats.material_moved(db, material, new_department_id)
+
+def user_created(db: Session):
+    bump(db, USERS, "", 1)
+    catalog_changed(db)
+
+def user_deleted(db: Session):
+    bump(db, USERS, "", -1)
+    catalog_changed(db)
+
+def catalog_changed(db: Session):
+    """Tăng phiên bản dữ liệu để ETag cũ của các API đọc hết hiệu lực. Không commit."""
+    bump(db, CATALOG_VERSION)
+
+async def catalog_version(db: AsyncSession) -> int:
+    value = await db.scalar(select(StatCounter.value).where(
+        StatCounter.name == CATALOG_VERSION,
+        StatCounter.bucket == ""
+    ))
+    return value or 0
+
+def get_value(db: Session, name: str, bucket: str = "") -> int:
+    value = db.query(StatCounter.value).filter(
+        StatCounter.name == name,
+        StatCounter.bucket == bucket
+    ).scalar()
+    return value or 0
+
+def get_values(db: Session, name: str, buckets: Iterable[str]) -> Dict[str, int]:
+    buckets = list(buckets)
+    rows = db.query(StatCounter.bucket, StatCounter.value).filter(
+        StatCounter.name == name,
+        StatCounter.bucket.in_(buckets)
+    ).all()
+    return dict(rows)
+
+def top_buckets(db: Session, name: str, limit: int) -> List[Tuple[str, int]]:
+    return db.query(StatCounter.bucket, StatCounter.value).filter(
+        StatCounter.name == name,
+        StatCounter.value > 0
+    ).order_by(StatCounter.value.desc(), StatCounter.bucket).limit(limit).all()
+
+def days_since(start: date, today: date) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range((today - start).days + 1)]
+
+def has_counters(db: Session) -> bool:
+    return db.query(StatCounter.id).filter(StatCounter.name == MATERIALS).first() is not None
+
+def rebuild_counters(db: Session) -> int:
+    """Tính lại toàn bộ bộ đếm từ các bảng gốc. Trả về tổng số học liệu."""
+    # catalog_version chỉ được tăng, không tính lại (ETag cũ không được dùng lại)
+    db.query(StatCounter).filter(StatCounter.name != CATALOG_VERSION).delete(synchronize_session=False)
+    catalog_changed(db)
+
+    rows = [
+        StatCounter(name=MATERIALS, bucket="", value=db.query(func.count(Material.id)).scalar()),
+        StatCounter(name=USERS, bucket="", value=db.query(func.count(User.id)).scalar()),
+        StatCounter(name=DEPARTMENTS, bucket="", value=db.query(func.count(Department.id)).scalar())
+    ]
+
+    by_day: Dict[str, int] = {}
+    for (created_at,) in db.query(Material.created_at).yield_per(1000):
+        bucket = _day_bucket(created_at)
+        by_day[bucket] = by_day.get(bucket, 0) + 1
+    rows += [StatCounter(name=MATERIALS_BY_DAY, bucket=b, value=v) for b, v in by_day.items()]
+
+    for name, column in ((MATERIALS_BY_UPLOADER, Material.uploader_id),
+                         (MATERIALS_BY_DEPARTMENT, Material.department_id)):
+        grouped = db.query(column, func.count(Material.id)).group_by(column).all()
+        rows += [StatCounter(name=name, bucket=str(key), value=count) for key, count in grouped]
+
+    db.add_all(rows)
+    daily_stats.rebuild(db)
+    db.info["stat_counters_changed"] = True
+    db.commit()
+    return rows[0].value
+
+class PayloadCache:
+    """Cache payload đã tính trong thời gian ngắn (dùng chung cho mọi người dùng)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: str, payload: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+dashboard_cache = PayloadCache(DASHBOARD_CACHE_SECONDS)
+
+@event.listens_for(Session, "after_commit")
+def _clear_cache_after_commit(session: Session):
+    if session.info.pop("stat_counters_changed", False):
+        dashboard_cache.clear()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes_after_rollback(session: Session):
+    session.info.pop("stat_counters_changed", None)
@@ -0,0 +1,219 @@
+"""
+Bảng tổng hợp theo ngày cho các biểu đồ thống kê (/api/statistics/...).
+
+Mỗi dòng của material_daily_stats là số học liệu (file_type = "") hoặc số file của
+một loại, đăng trong một ngày, theo khoa và người đăng. Bảng được cộng/trừ ngay trong
+transaction tạo/xóa/chuyển khoa học liệu (gọi từ app/counters.py), nên mỗi biểu đồ
+chỉ là một SUM ... GROUP BY trên một khoảng ngày có chỉ mục (day, hoặc department_id
++ day) thay vì quét bảng materials với extract(year/month).
+
+Chuỗi thời gian được gộp theo ngày, tuần (bắt đầu thứ Hai) hoặc tháng; các kỳ không
+có học liệu được điền 0.
+`python manage.py backfill-daily-stats [--from YYYY-MM-DD] [--to YYYY-MM-DD]` tính lại
+bảng từ dữ liệu gốc (toàn bộ hoặc một khoảng ngày).
+"""
+
+from sqlalchemy import bindparam, func, insert, select, update, Select
+from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from app.models.models import Material, MaterialDailyStat, MaterialFile
+
+GRANULARITIES = ("day", "week", "month")
+MAX_SERIES_POINTS = 1000
+REBUILD_BATCH_SIZE = 1000
+
+MATERIALS = ""  # file_type của dòng đếm số học liệu
+
+def _day(created_at: Optional[datetime]) -> date:
+    # Cùng mốc ngày với bộ đếm materials_by_day (app/counters.py)
+    return (created_at or datetime.utcnow()).date()
+
+# Dựng sẵn một lần: _bump chạy cho mỗi học liệu khi nhập hàng loạt
+_UPDATE_ROW = update(MaterialDailyStat).where(
+    MaterialDailyStat.day == bindparam("row_day"),
+    MaterialDailyStat.department_id == bindparam("row_department_id"),
+    MaterialDailyStat.uploader_id == bindparam("row_uploader_id"),
+    MaterialDailyStat.file_type == bindparam("row_file_type")
+).values(count=MaterialDailyStat.count + bindparam("delta")).execution_options(synchronize_session=False)
+
+_INSERT_ROW = insert(MaterialDailyStat)
+
+def _bump(db: Session, day: date, department_id: int, uploader_id: int, file_type: str, delta: int):
+    key = {
+        "row_day": day, "row_department_id": department_id,
+        "row_uploader_id": uploader_id, "row_file_type": file_type
+    }
+    if not db.execute(_UPDATE_ROW, {**key, "delta": delta}).rowcount:
+        db.execute(_INSERT_ROW, {
+            "day": day, "department_id": department_id, "uploader_id": uploader_id,
+            "file_type": file_type, "count": delta
+        })
+
+def _material_counts(material: Material) -> List[Tuple[str, int]]:
+    return [(MATERIALS, 1)] + sorted(Counter(f.file_type for f in material.files).items())
+
+def material_created(db: Session, material: Material, delta: int = 1):
+    """Gọi sau khi flush học liệu mới (cần created_at và danh sách file). Không commit."""
+    day = _day(material.created_at)
+    for file_type, count in _material_counts(material):
+        _bump(db, day, material.department_id, material.uploader_id, file_type, delta * count)
+
+def material_deleted(db: Session, material: Material):
+    material_created(db, material, -1)
+
+def material_moved(db: Session, material: Material, new_department_id: int):
+    """Chuyển các dòng của học liệu sang khoa mới (gọi trước khi đổi department_id)."""
+    if material.department_id == new_department_id:
+        return
+    day = _day(material.created_at)
+    for file_type, count in _material_counts(material):
+        _bump(db, day, material.department_id, material.uploader_id, file_type, -count)
+        _bump(db, day, new_department_id, material.uploader_id, file_type, count)
+
+def has_rows(db: Session) -> bool:
+    return db.query(MaterialDailyStat.id).first() is not None
+
+def rebuild(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Tính lại các dòng trong khoảng ngày [start, end] (None: không giới hạn) từ bảng
+    materials và material_files. Không commit. Trả về số học liệu trong khoảng.
+    """
+    delete_query = db.query(MaterialDailyStat)
+    material_query = db.query(
+        Material.created_at, Material.department_id, Material.uploader_id
+    )
+    file_query = db.query(
+        Material.created_at, Material.department_id, Material.uploader_id, MaterialFile.file_type
+    ).join(MaterialFile, MaterialFile.material_id == Material.id)
+
+    if start is not None:
+        delete_query = delete_query.filter(MaterialDailyStat.day >= start)
+        start_time = datetime.combine(start, datetime.min.time())
+        material_query = material_query.filter(Material.created_at >= start_time)
+        file_query = file_query.filter(Material.created_at >= start_time)
+    if end is not None:
+        delete_query = delete_query.filter(MaterialDailyStat.day <= end)
+        end_time = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        material_query = material_query.filter(Material.created_at < end_time)
+        file_query = file_query.filter(Material.created_at < end_time)
+
+    delete_query.delete(synchronize_session=False)
+
+    counts: Dict[tuple, int] = {}
+    total = 0
+    for created_at, department_id, uploader_id in material_query.yield_per(REBUILD_BATCH_SIZE):
+        key = (_day(created_at), department_id, uploader_id, MATERIALS)
+        counts[key] = counts.get(key, 0) + 1
+        total += 1
+    for created_at, department_id, uploader_id, file_type in file_query.yield_per(REBUILD_BATCH_SIZE):
+        key = (_day(created_at), department_id, uploader_id, file_type)
+        counts[key] = counts.get(key, 0) + 1
+
+    if counts:
+        db.execute(insert(MaterialDailyStat), [
+            {"day": day, "department_id": department_id, "uploader_id": uploader_id,
+             "file_type": file_type, "count": count}
+            for (day, department_id, uploader_id, file_type), count in counts.items()
+        ])
+    return total
+
+def period_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_period(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def period_label(start: date, granularity: str) -> str:
+    return start.strftime("%m/%Y" if granularity == "month" else "%d/%m/%Y")
+
+def periods(start: date, end: date, granularity: str) -> List[date]:
+    """Ngày bắt đầu của các kỳ phủ [start, end]; ValueError nếu quá MAX_SERIES_POINTS kỳ."""
+    if granularity not in GRANULARITIES:
+        raise ValueError("unknown granularity")
+    if start > end:
+        raise ValueError("start after end")
+
+    result = []
+    current = period_start(start, granularity)
+    while current <= end:
+        if len(result) == MAX_SERIES_POINTS:
+            raise ValueError("too many periods")
+        result.append(current)
+        current = _next_period(current, granularity)
+    return result
+
+def _filtered(
+    statement: Select,
+    start: Optional[date],
+    end: Optional[date],
+    department_id: Optional[int]
+) -> Select:
+    if department_id is not None:
+        statement = statement.where(MaterialDailyStat.department_id == department_id)
+    if start is not None:
+        statement = statement.where(MaterialDailyStat.day >= start)
+    if end is not None:
+        statement = statement.where(MaterialDailyStat.day <= end)
+    return statement
+
+def series(
+    db: Session,
+    start: date,
+    end: date,
+    granularity: str,
+    department_id: Optional[int] = None
+) -> Tuple[List[str], List[int]]:
+    """Số học liệu đăng theo từng kỳ trong [start, end]: (nhãn, số lượng)."""
+    buckets = periods(start, end, granularity)
+    by_day = db.execute(_filtered(
+        select(MaterialDailyStat.day, func.sum(MaterialDailyStat.count)).where(
+            MaterialDailyStat.file_type == MATERIALS
+        ), start, end, department_id
+    ).group_by(MaterialDailyStat.day)).all()
+
+    counts = dict.fromkeys(buckets, 0)
+    for day, count in by_day:
+        counts[period_start(day, granularity)] += count
+    return [period_label(p, granularity) for p in buckets], [counts[p] for p in buckets]
+
+def totals_by(
+    db: Session,
+    column: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    department_id: Optional[int] = None
+) -> Dict[object, int]:
+    """
+    Tổng theo một cột (department_id, uploader_id hoặc file_type) trong khoảng ngày.
+    Theo file_type là số file mỗi loại; theo cột khác là số học liệu.
+    """
+    key = getattr(MaterialDailyStat, column)
+    statement = select(key, func.sum(MaterialDailyStat.count))
+    if column == "file_type":
+        statement = statement.where(MaterialDailyStat.file_type != MATERIALS)
+    else:
+        statement = statement.where(MaterialDailyStat.file_type == MATERIALS)
+    rows = db.execute(_filtered(statement, start, end, department_id).group_by(key)).all()
+    return {value: count for value, count in rows if count}
+
+def total(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    department_id: Optional[int] = None
+) -> int:
+    value = db.scalar(_filtered(
+        select(func.sum(MaterialDailyStat.count)).where(MaterialDailyStat.file_type == MATERIALS),
+        start, end, department_id
+    ))
+    return value or 0
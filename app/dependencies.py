@@ -1,10 +1,12 @@
 from fastapi import Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
 from app.models.models import User
 from app.auth import decode_token
+from app.principal_cache import principal_cache
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_async_db)) -> User:
     token = request.cookies.get("access_token")
     
     if not token:
@@ -17,6 +19,11 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
     if token.startswith("Bearer "):
         token = token[7:]
     
+    # Token already verified recently: skip decoding and the users lookup
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+    
     payload = decode_token(token)
     
     if not payload:
@@ -32,16 +39,17 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
             detail="Token không hợp lệ"
         )
     
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Người dùng không tồn tại"
         )
     
+    principal_cache.put(token, user, payload.get("exp"))
     return user
 
-async def get_optional_user(request: Request, db: Session = Depends(get_db)):
+async def get_optional_user(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         return await get_current_user(request, db)
     except HTTPException:
@@ -0,0 +1,168 @@
+"""
+Tải file học liệu qua API có kiểm tra đăng nhập.
+
+RangeFileResponse hỗ trợ Range (một khoảng byte, dùng cho tải tiếp và tua video/PDF),
+If-Range và HEAD. Nếu server ASGI hỗ trợ extension "http.response.zerocopysend"
+thì file được gửi bằng sendfile (không copy qua Python); ngược lại đọc theo khối.
+
+Thư mục uploads không còn được phục vụ trực tiếp qua /static (PrivateStaticFiles).
+"""
+
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from typing import Optional, Tuple
+from urllib.parse import quote
+import aiofiles
+import os
+import unicodedata
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    "bytes=START-END" -> (start, end) (end tính cả byte cuối).
+    None nếu không có header hoặc yêu cầu nhiều khoảng (trả cả file);
+    RangeNotSatisfiable nếu khoảng nằm ngoài file.
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text == "":
+            # bytes=-N: N byte cuối
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    kind = "inline" if inline else "attachment"
+    # Tên ASCII cho trình duyệt cũ (bỏ dấu), tên UTF-8 đầy đủ trong filename*
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode() or "download"
+    fallback = fallback.replace('"', "")
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+class RangeFileResponse(Response):
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        headers: dict,
+        media_type: Optional[str] = None,
+        byte_range: Optional[Tuple[int, int]] = None,
+        send_body: bool = True
+    ):
+        self.path = path
+        self.send_body = send_body
+        self.start, self.end = byte_range if byte_range else (0, size - 1)
+        status_code = 206 if byte_range else 200
+
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(max(self.end - self.start + 1, 0))
+        if byte_range:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+
+        remaining = self.end - self.start + 1
+        if not self.send_body or remaining <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": remaining
+                })
+            return
+
+        async with aiofiles.open(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File bị cắt ngắn trong lúc gửi: kết thúc body để client không chờ mãi
+            await send({"type": "http.response.body", "body": b""})
+
+class PrivateStaticFiles(StaticFiles):
+    """
+    StaticFiles nhưng không phục vụ các thư mục con được chỉ định (vd. uploads).
+
+    Tên thư mục được so không phân biệt hoa thường, và file tìm được còn bị so theo
+    định danh (st_dev, st_ino) với thư mục riêng tư: trên hệ thống file không phân
+    biệt hoa thường (Windows, macOS) "Uploads/", "UPLOAD~1/" hay "uploads./" vẫn
+    trỏ tới cùng thư mục.
+    """
+
+    def __init__(self, *args, private_dirs: Tuple[str, ...] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.private_dirs = tuple(name.casefold() for name in private_dirs)
+
+    def get_path(self, scope: Scope) -> str:
+        path = super().get_path(scope)
+        first = os.path.normpath(path).split(os.sep)[0]
+        if first.casefold() in self.private_dirs:
+            raise StarletteHTTPException(status_code=404)
+        return path
+
+    def _private_stats(self):
+        stats = []
+        for name in self.private_dirs:
+            try:
+                stats.append(os.stat(os.path.join(self.directory, name)))
+            except OSError:
+                continue
+        return stats
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None:
+            return full_path, stat_result
+
+        private = self._private_stats()
+        root = os.path.realpath(self.directory)
+        current = full_path
+        while private and current != root:
+            try:
+                current_stat = os.stat(current)
+            except OSError:
+                break
+            if any(os.path.samestat(current_stat, p) for p in private):
+                return "", None
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+        return full_path, stat_result
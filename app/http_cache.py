@@ -0,0 +1,72 @@
+"""
+Hỗ trợ HTTP conditional request: ETag / Last-Modified và phản hồi 304 Not Modified.
+
+Các API đọc dữ liệu dùng catalog_etag(): ETag ghép từ catalog_version (tăng sau
+mỗi thao tác ghi, xem app/counters.py) và đường dẫn + query string của request,
+nên chỉ cần một truy vấn lấy phiên bản là trả được 304.
+"""
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+import hashlib
+
+def format_http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+def _etag_value(tag: str) -> str:
+    # So sánh yếu (RFC 9110): bỏ tiền tố W/
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[float] = None) -> bool:
+    """
+    True nếu bản client đang giữ vẫn còn mới.
+    If-None-Match được ưu tiên; If-Modified-Since chỉ xét khi không có If-None-Match.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return _etag_value(etag) in {_etag_value(t) for t in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+
+    return False
+
+def validator_headers(
+    etag: Optional[str],
+    last_modified: Optional[float] = None,
+    cache_control: str = "private, no-cache"
+) -> dict:
+    """Header cho phản hồi có thể kiểm tra lại (mặc định: trình duyệt luôn hỏi lại server)."""
+    headers = {"Cache-Control": cache_control}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = format_http_date(last_modified)
+    return headers
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def catalog_etag(request: Request, version: int, *extra) -> str:
+    """
+    ETag mạnh cho phản hồi chỉ phụ thuộc vào dữ liệu (phiên bản) và tham số request.
+    extra: các yếu tố khác ảnh hưởng kết quả (vd. ngày hiện tại với thống kê theo ngày).
+    """
+    key = "|".join([request.url.path, str(sorted(request.query_params.multi_items())), *map(str, extra)])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return f'"c{version}-{digest}"'
+
+def json_with_etag(payload, etag: str) -> ORJSONResponse:
+    return ORJSONResponse(payload, headers=validator_headers(etag))
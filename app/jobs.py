@@ -0,0 +1,282 @@
+"""
+Hàng đợi công việc xử lý tài liệu (trích xuất nội dung, cập nhật chỉ mục tìm kiếm,
+tạo sẵn preview DOCX/PPTX).
+
+Công việc được lưu trong bảng jobs nên không mất khi khởi động lại server.
+JobRunner chạy trong event loop: nhận job bằng UPDATE có điều kiện (an toàn khi
+nhiều web worker cùng chạy), phần tốn CPU (PyPDF2, python-docx, python-pptx)
+được đưa sang ProcessPoolExecutor, phần database chạy trong threadpool.
+Job lỗi được thử lại với thời gian chờ tăng dần, tối đa JOB_MAX_ATTEMPTS lần.
+Nếu một tiến trình worker chết (hết bộ nhớ, thư viện đọc file bị crash), pool bị hỏng
+được thay bằng pool mới và tác vụ chạy lại một lần; lỗi lần nữa thì chỉ job đó thất bại.
+
+Cấu hình qua biến môi trường:
+    JOB_WORKERS=2        Số tiến trình worker (0 = không chạy trong web server,
+                         dùng `python manage.py run-jobs` ở tiến trình riêng)
+    JOB_POLL_SECONDS=2   Chu kỳ kiểm tra job mới
+    JOB_MAX_ATTEMPTS=3   Số lần thử tối đa
+"""
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Optional
+from dotenv import load_dotenv
+from app.database.database import SessionLocal
+from app.models.models import Job, JobStatus, Material, MaterialFile
+from app.preview_cache import preview_cache
+from app.storage import to_disk_path
+from app import text_store, search_index, counters
+import asyncio
+import json
+import multiprocessing
+import os
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = 600
+JOB_RETRY_BASE_SECONDS = 10
+
+def enqueue_job(db: Session, kind: str, material_id: Optional[int] = None, **payload) -> Job:
+    """Thêm job vào hàng đợi trong transaction hiện tại. Không commit."""
+    job = Job(
+        kind=kind,
+        material_id=material_id,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status=JobStatus.PENDING,
+        run_after=datetime.utcnow()
+    )
+    db.add(job)
+    return job
+
+def material_processing_status(db: Session, material_id: int) -> dict:
+    """Trạng thái xử lý của một học liệu, tổng hợp từ các job của nó."""
+    jobs = db.query(Job).filter(Job.material_id == material_id).order_by(Job.id).all()
+
+    statuses = {job.status for job in jobs}
+    if JobStatus.FAILED in statuses:
+        overall = JobStatus.FAILED
+    elif JobStatus.RUNNING in statuses:
+        overall = JobStatus.RUNNING
+    elif JobStatus.PENDING in statuses:
+        overall = JobStatus.PENDING
+    else:
+        overall = JobStatus.DONE
+
+    return {
+        "material_id": material_id,
+        "status": overall.value,
+        "jobs": [
+            {
+                "id": job.id,
+                "kind": job.kind,
+                "status": job.status.value,
+                "attempts": job.attempts,
+                "last_error": job.last_error,
+                "updated_at": job.updated_at.isoformat() if job.updated_at else None
+            }
+            for job in jobs
+        ]
+    }
+
+def _claimable():
+    now = datetime.utcnow()
+    return or_(
+        and_(Job.status == JobStatus.PENDING, Job.run_after <= now),
+        and_(Job.status == JobStatus.RUNNING, Job.locked_until < now)  # Worker cũ đã chết
+    )
+
+def claim_jobs(db: Session, limit: int) -> List[Job]:
+    """Nhận tối đa `limit` job; mỗi job chỉ một worker nhận được nhờ UPDATE có điều kiện."""
+    candidates = db.query(Job.id).filter(_claimable()).order_by(Job.id).limit(limit).all()
+
+    claimed = []
+    for (job_id,) in candidates:
+        updated = db.query(Job).filter(Job.id == job_id, _claimable()).update({
+            Job.status: JobStatus.RUNNING,
+            Job.attempts: Job.attempts + 1,
+            Job.locked_until: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS),
+            Job.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(job_id)
+    db.commit()
+
+    if not claimed:
+        return []
+    jobs = db.query(Job).filter(Job.id.in_(claimed)).all()
+    for job in jobs:
+        db.expunge(job)
+    return jobs
+
+def finish_job(db: Session, job_id: int, error: Optional[str] = None):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if job is None:
+        return
+
+    job.locked_until = None
+    if error is None:
+        job.status = JobStatus.DONE
+        job.last_error = None
+    elif job.attempts >= JOB_MAX_ATTEMPTS:
+        job.status = JobStatus.FAILED
+        job.last_error = error
+    else:
+        job.status = JobStatus.PENDING
+        job.last_error = error
+        job.run_after = datetime.utcnow() + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** job.attempts)
+    db.commit()
+
+def _in_session(fn, *args):
+    """Chạy fn(db, *args) trong một session riêng rồi commit (gọi từ threadpool)."""
+    db = SessionLocal()
+    try:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+def _enqueue_reindex_for_path(db: Session, public_path: str):
+    material_ids = db.query(MaterialFile.material_id).filter(
+        MaterialFile.path == public_path
+    ).distinct().all()
+    for (material_id,) in material_ids:
+        enqueue_job(db, "index_material", material_id=material_id)
+
+def _index_material(db: Session, material_id: int):
+    material = db.query(Material).filter(Material.id == material_id).first()
+    if material is not None:
+        search_index.index_material(db, material)
+        # Nội dung mới làm thay đổi kết quả tìm kiếm theo nội dung
+        counters.catalog_changed(db)
+
+class JobRunner:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = set()
+        self.handlers = {
+            "extract_text": self._run_extract_text,
+            "index_material": self._run_index_material,
+            "build_preview": self._run_build_preview
+        }
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self.workers <= 0 or self._task is not None:
+            return
+        self.pool = self._new_pool()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        print(f"✅ Đã khởi động hàng đợi xử lý tài liệu ({self.workers} worker)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: fork khi server đã có nhiều thread (threadpool, aiosqlite) có thể làm tiến trình con treo
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        """Thay pool bị hỏng (chỉ một lần dù nhiều tác vụ cùng gặp lỗi)."""
+        if self.pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = self._new_pool()
+        print("⚠️ Tiến trình worker bị dừng đột ngột, đã tạo lại worker pool")
+
+    def notify(self):
+        """Báo có job mới để không phải đợi hết chu kỳ kiểm tra."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_cpu(self, fn, *args):
+        """Chạy hàm tốn CPU trong worker pool (hoặc threadpool nếu pool chưa khởi động)."""
+        if self.pool is None:
+            return await run_in_threadpool(fn, *args)
+
+        for attempt in range(2):
+            pool = self.pool
+            if pool is None:
+                raise BrokenProcessPool("job runner stopped")
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args))
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                if attempt:
+                    raise
+
+    async def _loop(self):
+        while True:
+            free = self.workers - len(self._running)
+            jobs = await run_in_threadpool(_in_session, claim_jobs, free) if free > 0 else []
+
+            for job in jobs:
+                task = asyncio.get_running_loop().create_task(self._run(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self, job: Job):
+        error = None
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            await handler(job, json.loads(job.payload or "{}"))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:1000]
+            print(f"[JOB ERROR] #{job.id} {job.kind} (lần {job.attempts}): {error}")
+
+        await run_in_threadpool(_in_session, finish_job, job.id, error)
+        if error is None:
+            self.notify()
+
+    async def _run_extract_text(self, job: Job, payload: dict):
+        path = payload["path"]
+        plan = await run_in_threadpool(_in_session, text_store.plan_extraction, path, payload.get("content_hash"))
+
+        if plan is not None:
+            disk_path, content_hash = plan
+            text = await self.run_cpu(partial(text_store.extract_text_from_file, raise_errors=True), disk_path)
+            await run_in_threadpool(_in_session, text_store.save_extracted_text, path, content_hash, text)
+
+        await run_in_threadpool(_in_session, _enqueue_reindex_for_path, path)
+
+    async def _run_index_material(self, job: Job, payload: dict):
+        await run_in_threadpool(_in_session, _index_material, job.material_id)
+
+    async def _run_build_preview(self, job: Job, payload: dict):
+        await preview_cache.get_or_build(payload["key"], to_disk_path(payload["path"]), self.run_cpu)
+
+job_runner = JobRunner()
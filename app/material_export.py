@@ -0,0 +1,78 @@
+"""
+Xuất toàn bộ danh mục học liệu (kèm khoa, người đăng, danh sách file) dạng NDJSON hoặc CSV.
+
+Dữ liệu được đọc theo lô EXPORT_BATCH_SIZE dòng bằng AsyncSession.stream() + yield_per
+(server-side cursor nếu driver hỗ trợ) và ghi ra ngay từng lô; identity map chỉ giữ tham
+chiếu yếu nên các lô đã gửi được giải phóng, bộ nhớ không tăng theo kích thước danh mục.
+Điều kiện lọc giống GET /api/materials (MaterialFilter), thứ tự theo id tăng dần.
+
+Generator tự mở session riêng vì session của dependency đã đóng khi StreamingResponse
+bắt đầu gửi dữ liệu.
+"""
+
+from sqlalchemy import select
+from typing import AsyncIterator, List
+from app.database.database import AsyncSessionLocal
+from app.models.models import Material
+from app.material_query import MaterialFilter
+from app.serializers import with_relations, serialize_material
+import csv
+import io
+import orjson
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv")  # StreamingResponse tự thêm charset=utf-8
+}
+
+CSV_COLUMNS = [
+    "id", "title", "subject", "topic", "department_code", "department_name",
+    "uploader", "created_at", "file_count", "files"
+]
+
+async def _batches(material_filter: MaterialFilter) -> AsyncIterator[List[Material]]:
+    statement = material_filter.apply(with_relations(select(Material))).order_by(Material.id)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.scalars().partitions():
+            yield partition
+
+async def stream_ndjson(material_filter: MaterialFilter) -> AsyncIterator[bytes]:
+    async for batch in _batches(material_filter):
+        yield b"".join(orjson.dumps(serialize_material(m)) + b"\n" for m in batch)
+
+def _csv_row(material: Material) -> list:
+    return [
+        material.id,
+        material.title,
+        material.subject,
+        material.topic or "",
+        material.department.code,
+        material.department.name,
+        material.uploader.full_name,
+        material.created_at.isoformat(),
+        len(material.files),
+        " | ".join(f"{f.file_type}: {f.original_name}" for f in material.files)
+    ]
+
+async def stream_csv(material_filter: MaterialFilter) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM để Excel nhận đúng UTF-8 (tiếng Việt có dấu)
+    writer.writerow(CSV_COLUMNS)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+    async for batch in _batches(material_filter):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_row(m) for m in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+def stream_export(material_filter: MaterialFilter, export_format: str) -> AsyncIterator[bytes]:
+    if export_format == "csv":
+        return stream_csv(material_filter)
+    return stream_ndjson(material_filter)
@@ -0,0 +1,328 @@
+"""
+Tạo học liệu: insert_material() dùng chung cho POST /api/materials và nhập hàng loạt.
+
+Nhập hàng loạt (POST /api/materials/import, `python manage.py import-materials`) nhận
+một file ZIP và manifest CSV/JSON (gửi kèm, hoặc manifest.csv / manifest.json ở gốc ZIP).
+Mỗi dòng manifest là một file:
+
+    file        Đường dẫn file trong ZIP
+    title       Tiêu đề học liệu
+    subject     Môn học
+    topic       Chủ đề (không bắt buộc)
+    department  Mã khoa (K1), id hoặc tên khoa
+    type        Tài liệu / Bài giảng / Đề cương / Trình chiếu (mặc định: Tài liệu)
+    group       Không bắt buộc: các dòng cùng group được gộp thành một học liệu nhiều
+                file (tiêu đề, môn học, khoa lấy theo dòng đầu tiên của nhóm)
+
+File được đọc thẳng từ ZIP theo khối vào kho lưu trữ (không giải nén ra thư mục tạm).
+Dữ liệu được kiểm tra trước khi ghi; học liệu được ghi theo lô IMPORT_BATCH_SIZE trong
+một transaction. Nếu một học liệu lỗi khi ghi, lô được rollback và các học liệu còn lại
+của lô được ghi lại (không dùng SAVEPOINT vì driver sqlite3 tự commit khi RELEASE).
+Trích xuất nội dung và tạo preview được đưa vào hàng đợi như khi upload thường.
+Kết quả trả về theo từng dòng manifest.
+"""
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.database.database import SessionLocal
+from app.models.models import Material, MaterialFile
+from app.storage import (
+    acquire_blob, discard_new_uploads, discard_replaced_uploads, store_file, SavedUpload, UploadTooLarge, UploadLost, MAX_UPLOAD_FILE_MB
+)
+from app.serializers import files_to_json
+from app.previews import PREVIEW_EXTENSIONS
+from app.preview_cache import preview_key
+from app.jobs import enqueue_job
+from app import search_index, counters, reference_data
+import csv
+import io
+import json
+import mimetypes
+import os
+import unicodedata
+import zipfile
+import zlib
+
+load_dotenv()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "200"))
+
+MANIFEST_NAMES = ("manifest.csv", "manifest.json")
+
+FILE_TYPES = {
+    "tài liệu": "Tài liệu",
+    "tailieu": "Tài liệu",
+    "bài giảng": "Bài giảng",
+    "baigiang": "Bài giảng",
+    "đề cương": "Đề cương",
+    "decuong": "Đề cương",
+    "trình chiếu": "Trình chiếu",
+    "trinhchieu": "Trình chiếu"
+}
+
+def insert_material(db: Session, saved_files: List[SavedUpload], **fields) -> Material:
+    """Tạo học liệu, các dòng file, bộ đếm và job xử lý nền. Không commit."""
+    all_files = []
+    for saved in saved_files:
+        acquire_blob(db, saved)
+        all_files.append(MaterialFile(
+            position=len(all_files),
+            file_type=saved.file_type,
+            path=saved.public_path,
+            original_name=saved.original_name,
+            size=saved.size,
+            content_hash=saved.content_hash,
+            mime_type=mimetypes.guess_type(saved.original_name)[0]
+        ))
+
+    new_material = Material(
+        files_json=files_to_json(all_files),
+        files=all_files,
+        **fields
+    )
+
+    db.add(new_material)
+    db.flush()
+    search_index.index_material(db, new_material)
+    counters.material_created(db, new_material)
+    counters.catalog_changed(db)
+
+    # Trích xuất nội dung file chạy nền; chỉ mục được cập nhật lại khi xong
+    for material_file in all_files:
+        enqueue_job(
+            db, "extract_text",
+            material_id=new_material.id,
+            path=material_file.path,
+            content_hash=material_file.content_hash
+        )
+        if os.path.splitext(material_file.path)[1].lower() in PREVIEW_EXTENSIONS:
+            enqueue_job(
+                db, "build_preview",
+                material_id=new_material.id,
+                path=material_file.path,
+                key=preview_key(material_file)
+            )
+
+    return new_material
+
+class InvalidImport(Exception):
+    """Lỗi của cả lần nhập (ZIP hỏng, manifest không đọc được)."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+class _RowError(Exception):
+    pass
+
+def _normalize_name(name: str) -> str:
+    # ZIP tạo trên macOS lưu tên dạng NFD; manifest thường là NFC
+    return unicodedata.normalize("NFC", name.replace("\\", "/").lstrip("/"))
+
+def parse_manifest(data: bytes, filename: str) -> List[Dict[str, str]]:
+    """Manifest CSV (có dòng tiêu đề) hoặc JSON (danh sách, hoặc {"materials": [...]})."""
+    if filename.lower().endswith(".json"):
+        try:
+            items = json.loads(data)
+        except ValueError:
+            raise InvalidImport("Manifest JSON không hợp lệ")
+        if isinstance(items, dict):
+            items = items.get("materials")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise InvalidImport("Manifest JSON phải là danh sách các dòng")
+    else:
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise InvalidImport("Manifest CSV phải dùng mã hóa UTF-8")
+        items = list(csv.DictReader(io.StringIO(text)))
+
+    rows = [
+        {str(key).strip().lower(): "" if value is None else str(value).strip() for key, value in item.items() if key}
+        for item in items
+    ]
+    if not rows:
+        raise InvalidImport("Manifest không có dòng nào")
+    return rows
+
+def _find_manifest(archive: zipfile.ZipFile) -> Tuple[bytes, str]:
+    for name in MANIFEST_NAMES:
+        try:
+            return archive.read(name), name
+        except KeyError:
+            continue
+    raise InvalidImport("Không tìm thấy manifest (gửi kèm, hoặc manifest.csv / manifest.json trong ZIP)")
+
+class ArchiveImporter:
+    def __init__(self, db: Session, archive: zipfile.ZipFile, uploader_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.archive = archive
+        self.uploader_id = uploader_id
+        self.batch_size = batch_size
+        self.members = {
+            _normalize_name(info.filename): info
+            for info in archive.infolist() if not info.is_dir()
+        }
+        self.departments = {}
+        for department in reference_data.departments.get_sync(db).rows:
+            for key in (str(department["id"]), department["code"], department["name"]):
+                self.departments[key.casefold()] = department
+        self.results: List[dict] = []
+
+    def run(self, rows: List[Dict[str, str]]) -> dict:
+        groups = self._group_rows(rows)
+        for start in range(0, len(groups), self.batch_size):
+            # Đọc file của cả lô trước, để transaction ghi database ngắn (SQLite khóa ghi toàn bộ)
+            prepared = []
+            for group in groups[start:start + self.batch_size]:
+                try:
+                    fields, files = self._prepare(group)
+                    prepared.append((group, fields, self._extract(files)))
+                except _RowError as e:
+                    self._record(group, error=str(e))
+            if prepared:
+                self._write_batch(prepared)
+
+        self.results.sort(key=lambda result: result["row"])
+        return {
+            "materials_created": len({r["material_id"] for r in self.results if r["status"] == "created"}),
+            "files_imported": sum(1 for r in self.results if r["status"] == "created"),
+            "errors": sum(1 for r in self.results if r["status"] == "error"),
+            "rows": self.results
+        }
+
+    @staticmethod
+    def _group_rows(rows: List[Dict[str, str]]) -> List[List[Tuple[int, Dict[str, str]]]]:
+        groups = []
+        by_key = {}
+        for number, row in enumerate(rows, start=1):
+            key = row.get("group")
+            if not key:
+                groups.append([(number, row)])
+            elif key in by_key:
+                by_key[key].append((number, row))
+            else:
+                by_key[key] = [(number, row)]
+                groups.append(by_key[key])
+        return groups
+
+    def _prepare(self, group) -> Tuple[dict, list]:
+        _, first = group[0]
+        if not first.get("title") or not first.get("subject"):
+            raise _RowError("Thiếu title hoặc subject")
+
+        department = self.departments.get(first.get("department", "").casefold())
+        if department is None:
+            raise _RowError(f"Không tìm thấy khoa: {first.get('department', '')}")
+
+        files = []
+        for _, row in group:
+            info = self.members.get(_normalize_name(row.get("file", "")))
+            if info is None:
+                raise _RowError(f"Không có file trong ZIP: {row.get('file', '')}")
+
+            file_type = FILE_TYPES.get((row.get("type") or "tài liệu").casefold())
+            if file_type is None:
+                raise _RowError(f"Loại file không hợp lệ: {row.get('type')}")
+            files.append((info, file_type))
+
+        fields = {
+            "title": first["title"],
+            "subject": first["subject"],
+            "topic": first.get("topic", ""),
+            "department_id": department["id"]
+        }
+        return fields, files
+
+    def _extract(self, files) -> List[SavedUpload]:
+        """Đọc từng file trong ZIP theo khối vào kho lưu trữ."""
+        saved_files = []
+        try:
+            for info, file_type in files:
+                name = os.path.basename(_normalize_name(info.filename))
+                if info.file_size > MAX_UPLOAD_FILE_MB * 1024 * 1024:
+                    raise UploadTooLarge(f"File {name} vượt quá {MAX_UPLOAD_FILE_MB} MB")
+                with self.archive.open(info) as source:
+                    saved_files.append(store_file(source, file_type, name))
+        except UploadTooLarge as e:
+            discard_new_uploads(saved_files)
+            raise _RowError(e.message)
+        except (zipfile.BadZipFile, zlib.error, RuntimeError, OSError) as e:
+            # RuntimeError: file trong ZIP có mật khẩu
+            discard_new_uploads(saved_files)
+            raise _RowError(f"Không đọc được file trong ZIP: {e}")
+        return saved_files
+
+    def _insert(self, fields: dict, saved_files: List[SavedUpload]) -> int:
+        return insert_material(self.db, saved_files, uploader_id=self.uploader_id, **fields).id
+
+    def _write_batch(self, prepared):
+        written = []
+        failed_files: List[SavedUpload] = []
+        pending = list(prepared)
+        while pending:
+            group, fields, saved_files = pending.pop(0)
+            try:
+                written.append((group, fields, saved_files, self._insert(fields, saved_files)))
+            except (SQLAlchemyError, UploadLost) as e:
+                # Bỏ học liệu lỗi: rollback cả lô rồi ghi lại từng học liệu trước đó của lô
+                # (cùng cách xử lý lỗi, học liệu nào lỗi lần nữa cũng bị bỏ)
+                self.db.rollback()
+                failed_files += saved_files
+                self._record(group, error=e.message if isinstance(e, UploadLost) else f"Lỗi ghi database: {e.__class__.__name__}")
+                pending = [(g, f, saved) for g, f, saved, _ in written] + pending
+                written = []
+
+        try:
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            for group, _, saved_files, _ in written:
+                failed_files += saved_files
+                self._record(group, error=f"Lỗi ghi database: {e.__class__.__name__}")
+            written = []
+        else:
+            for group, _, _, material_id in written:
+                self._record(group, material_id=material_id)
+
+        # Transaction đã kết thúc: xóa bản trùng nội dung của các học liệu đã ghi và nội dung
+        # mới ghi của học liệu lỗi (file học liệu khác trong lô đã dùng thì được giữ lại)
+        discard_replaced_uploads([saved for _, _, saved_files, _ in written for saved in saved_files])
+        discard_new_uploads(failed_files)
+
+        # Không giữ các đối tượng của lô đã ghi trong session
+        self.db.expunge_all()
+
+    def _record(self, group, material_id: Optional[int] = None, error: Optional[str] = None):
+        for number, row in group:
+            result = {"row": number, "file": row.get("file", "")}
+            if error is None:
+                result.update(status="created", material_id=material_id)
+            else:
+                result.update(status="error", error=error)
+            self.results.append(result)
+
+def import_archive(
+    archive_file: BinaryIO,
+    uploader_id: int,
+    manifest: Optional[Tuple[bytes, str]] = None,
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> dict:
+    """
+    Nhập học liệu từ ZIP (file object có seek). manifest: (nội dung, tên file) nếu gửi
+    riêng; None thì tìm trong ZIP. Chạy đồng bộ với session riêng (gọi từ threadpool/CLI).
+    """
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except zipfile.BadZipFile:
+        raise InvalidImport("File ZIP không hợp lệ")
+
+    with archive:
+        rows = parse_manifest(*(manifest or _find_manifest(archive)))
+        db = SessionLocal()
+        try:
+            return ArchiveImporter(db, archive, uploader_id, batch_size).run(rows)
+        finally:
+            db.close()
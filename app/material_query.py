@@ -0,0 +1,251 @@
+"""
+Bộ lọc, sắp xếp và phân trang keyset cho danh sách học liệu.
+
+Các điều kiện lọc được đặt tên (department, search, subject, ...) để có thể bỏ bớt
+một điều kiện khi đếm facet của chính cột đó. Phân trang dùng cursor (giá trị cột
+sắp xếp + id của dòng cuối) nên mỗi trang chỉ tốn một truy vấn có giới hạn,
+không phụ thuộc vào vị trí trang.
+Truy vấn được dựng bằng select() và chạy qua AsyncSession của route.
+
+Tổng số và các facet (khoa, loại file, người đăng, môn học, chủ đề, tháng đăng) được
+đếm trong một truy vấn duy nhất: mỗi facet là một GROUP BY có giới hạn, ghép bằng UNION ALL.
+"""
+
+from sqlalchemy import func, select, tuple_, cast, distinct, extract, false, literal, union_all, Select, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from app.models.models import Material, MaterialFile, User
+from app import search_index, reference_data
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+SORT_KEYS = ("created_at", "title", "subject", "topic", "uploader", "relevance")
+FACET_LIMIT = 200
+
+FACETS = ("department", "file_type", "uploader", "subject", "topic", "month")
+DEFAULT_FACETS = ("subject", "topic", "uploader")
+
+class MaterialFilter:
+    """Tập điều kiện lọc học liệu dùng chung cho danh sách, đếm tổng và facet."""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        department_id: Optional[int] = None,
+        search: Optional[str] = None,
+        search_content: bool = False,
+        uploader: Optional[str] = None,
+        subject: Optional[str] = None,
+        topic: Optional[str] = None,
+        uploader_name: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        file_type: Optional[str] = None
+    ):
+        self.match = None
+        self.hits = None  # Subquery (material_id, rank) của bộ lọc search, dùng cho sắp xếp relevance
+        self.conditions = {}
+
+        if department_id:
+            self.conditions["department"] = Material.department_id == department_id
+
+        if search:
+            if search_index.is_supported(db):
+                self.match = search_index.build_match_query(search, search_content)
+                self.hits = search_index.search_subquery(self.match, search)
+                if self.hits is not None:
+                    self.conditions["search"] = Material.id.in_(select(self.hits.c.material_id))
+                else:
+                    # Từ khóa chỉ gồm dấu câu: không khớp học liệu nào (không bỏ qua bộ lọc)
+                    self.conditions["search"] = false()
+            else:
+                self.conditions["search"] = search_index.like_filter(search, search_content)
+
+        if uploader:
+            # Tìm kiếm theo tên người đăng (chứa chuỗi): tra chỉ mục trigram, từ khóa
+            # ngắn hơn 3 ký tự (hoặc database không hỗ trợ FTS5) thì quét bảng users
+            uploader_hits = search_index.uploader_subquery(uploader) if search_index.is_supported(db) else None
+            if uploader_hits is not None:
+                self.conditions["uploader"] = Material.id.in_(select(uploader_hits.c.material_id))
+            else:
+                self.conditions["uploader"] = Material.uploader_id.in_(
+                    select(User.id).where(User.full_name.like(f"%{uploader}%"))
+                )
+
+        if subject:
+            self.conditions["subject"] = Material.subject == subject
+
+        if topic:
+            self.conditions["topic"] = Material.topic == topic
+
+        if uploader_name:
+            # Lọc theo cột người đăng (khớp chính xác họ tên)
+            self.conditions["uploader_name"] = Material.uploader_id.in_(
+                select(User.id).where(User.full_name == uploader_name)
+            )
+
+        if file_type:
+            # Học liệu có ít nhất một file thuộc loại này
+            self.conditions["file_type"] = Material.id.in_(
+                select(MaterialFile.material_id).where(MaterialFile.file_type == file_type)
+            )
+
+        if date_from:
+            self.conditions["date_from"] = Material.created_at >= datetime.combine(date_from, datetime.min.time())
+
+        if date_to:
+            self.conditions["date_to"] = Material.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    def apply(self, statement: Select, exclude: Iterable[str] = ()) -> Select:
+        for name, condition in self.conditions.items():
+            if name not in exclude:
+                statement = statement.where(condition)
+        return statement
+
+def encode_cursor(sort: str, order: str, value, material_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, material_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str):
+    """Giải mã cursor; trả về (value, id) hoặc raise ValueError nếu không hợp lệ."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, material_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("invalid cursor")
+
+    if cursor_sort != sort or cursor_order != order or not isinstance(material_id, int):
+        raise ValueError("cursor does not match sort order")
+
+    if sort == "created_at":
+        value = datetime.fromisoformat(value)
+    return value, material_id
+
+def sort_expression(sort: str, rank_column=None):
+    if sort == "created_at":
+        return Material.created_at
+    if sort == "title":
+        return Material.title
+    if sort == "subject":
+        return Material.subject
+    if sort == "topic":
+        return func.coalesce(Material.topic, "")
+    if sort == "uploader":
+        return User.full_name
+    if sort == "relevance":
+        return rank_column
+    raise ValueError(sort)
+
+async def paginate(
+    db: AsyncSession,
+    statement: Select,
+    sort_column,
+    order: str,
+    cursor_value=None,
+    limit: int = DEFAULT_PAGE_SIZE
+):
+    """
+    Áp dụng sắp xếp (cột sắp xếp, id) và điều kiện keyset rồi chạy truy vấn.
+    Trả về (rows, has_more); statement phải trả về các dòng (Material, giá trị cột sắp xếp).
+    """
+    key = tuple_(sort_column, Material.id)
+
+    if cursor_value is not None:
+        statement = statement.where(key < tuple_(*cursor_value) if order == "desc" else key > tuple_(*cursor_value))
+
+    if order == "desc":
+        statement = statement.order_by(sort_column.desc(), Material.id.desc())
+    else:
+        statement = statement.order_by(sort_column.asc(), Material.id.asc())
+
+    rows = (await db.execute(statement.limit(limit + 1))).all()
+    return rows[:limit], len(rows) > limit
+
+def parse_facets(value: Optional[str]) -> Tuple[str, ...]:
+    """Danh sách facet từ tham số facets=a,b,c (None: mặc định, rỗng: không có facet)."""
+    if value is None:
+        return DEFAULT_FACETS
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if any(name not in FACETS for name in names):
+        raise ValueError("unknown facet")
+    return names
+
+def _facet_query(material_filter: MaterialFilter, name: str) -> Select:
+    """GROUP BY của một facet (facet, value, count), bỏ điều kiện lọc của chính cột đó."""
+    count = func.count(Material.id)
+    if name == "department":
+        value, exclude = Material.department_id, ("department",)
+    elif name == "file_type":
+        # Một học liệu có nhiều file cùng loại chỉ được đếm một lần
+        value, exclude = MaterialFile.file_type, ("file_type",)
+        count = func.count(distinct(Material.id))
+    elif name == "uploader":
+        value, exclude = User.full_name, ("uploader_name",)
+    elif name == "subject":
+        value, exclude = Material.subject, ("subject",)
+    elif name == "topic":
+        value, exclude = Material.topic, ("topic",)
+    elif name == "month":
+        # YYYYMM; extract() được dịch theo từng database (strftime trên SQLite)
+        value = extract("year", Material.created_at) * 100 + extract("month", Material.created_at)
+        exclude = ("date_from", "date_to")
+    else:
+        raise ValueError(name)
+
+    statement = select(literal(name).label("facet"), cast(value, String).label("value"), count.label("count"))
+    if name == "file_type":
+        statement = statement.select_from(Material).join(MaterialFile, MaterialFile.material_id == Material.id)
+    elif name == "uploader":
+        statement = statement.select_from(Material).join(User, Material.uploader_id == User.id)
+    elif name == "topic":
+        statement = statement.where(Material.topic.isnot(None), Material.topic != "")
+
+    statement = material_filter.apply(statement, exclude=exclude)
+    part = statement.group_by(value).order_by(value).limit(FACET_LIMIT).subquery()
+    return select(part.c.facet, part.c.value, part.c.count)
+
+async def facet_counts(
+    db: AsyncSession,
+    material_filter: MaterialFilter,
+    facets: Iterable[str] = DEFAULT_FACETS
+) -> Tuple[int, Dict[str, list]]:
+    """
+    Tổng số học liệu khớp bộ lọc và số học liệu theo từng facet cho tập lọc hiện tại
+    (mỗi facet bỏ lọc của chính cột đó), trong một truy vấn.
+    """
+    total_query = material_filter.apply(
+        select(literal("").label("facet"), literal("").label("value"), func.count(Material.id).label("count"))
+    )
+    parts = [total_query] + [_facet_query(material_filter, name) for name in facets]
+
+    total = 0
+    result = {name: [] for name in facets}
+    for facet, value, count in await db.execute(union_all(*parts)):
+        if not facet:
+            total = count
+        else:
+            result[facet].append({"value": value, "count": count})
+
+    if "department" in result:
+        snapshot = await reference_data.departments.get(db)
+        result["department"] = sorted((
+            {"value": int(item["value"]), "label": snapshot.by_id.get(int(item["value"]), {}).get("name"), "count": item["count"]}
+            for item in result["department"]
+        ), key=lambda item: item["value"])
+    if "month" in result:
+        # Tháng mới nhất trước, giá trị dạng YYYY-MM
+        result["month"] = sorted((
+            {"value": f"{item['value'][:4]}-{item['value'][4:]}", "count": item["count"]}
+            for item in result["month"]
+        ), key=lambda item: item["value"], reverse=True)
+    for name in ("file_type", "uploader", "subject", "topic"):
+        if name in result:
+            result[name].sort(key=lambda item: item["value"])
+
+    return total, result
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Enum, Text, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.database import Base
@@ -9,6 +9,12 @@ class UserRole(str, enum.Enum):
     SUPERUSER = "superuser"
     USER = "user"
 
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -40,7 +46,8 @@ class Material(Base):
     subject = Column(String, nullable=False)  # Môn học
     topic = Column(String)  # Chủ đề
     
-    # Lưu nhiều file dạng JSON: [{"type": "tailieu", "path": "...", "name": "..."}, ...]
+    # Bản sao JSON của danh sách file (giữ để tương thích phiên bản cũ).
+    # Dữ liệu chính thức nằm trong bảng material_files.
     files_json = Column(Text, nullable=False)  # JSON string chứa thông tin các file
     
     department_id = Column(Integer, ForeignKey("departments.id"), nullable=False)
@@ -50,3 +57,95 @@ class Material(Base):
     
     department = relationship("Department", back_populates="materials")
     uploader = relationship("User", back_populates="materials")
+    files = relationship(
+        "MaterialFile",
+        back_populates="material",
+        order_by="MaterialFile.position",
+        cascade="all, delete-orphan"
+    )
+
+class MaterialFile(Base):
+    __tablename__ = "material_files"
+    __table_args__ = (
+        Index("ix_material_files_material_position", "material_id", "position", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    material_id = Column(Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)  # Thứ tự file trong học liệu (file_index)
+    file_type = Column(String, nullable=False, index=True)  # Tài liệu, Bài giảng, Đề cương, Trình chiếu
+    path = Column(String, nullable=False, index=True)  # Đường dẫn public: /static/uploads/...
+    original_name = Column(String, nullable=False)
+    size = Column(Integer)
+    content_hash = Column(String, index=True)  # SHA-256
+    mime_type = Column(String)
+    download_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    material = relationship("Material", back_populates="files")
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String, unique=True, index=True, nullable=False)  # SHA-256
+    path = Column(String, nullable=False)  # Đường dẫn public: /static/uploads/ab/abcd....pdf
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Số MaterialFile đang dùng
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ExtractedText(Base):
+    __tablename__ = "extracted_texts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_path = Column(String, unique=True, index=True, nullable=False)  # Đường dẫn public: /static/uploads/...
+    content_hash = Column(String, index=True, nullable=False)  # SHA-256 của nội dung file
+    file_size = Column(Integer)
+    file_mtime = Column(Float)
+    text = Column(Text, nullable=False, default="")
+    extracted_at = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # extract_text, index_material, ...
+    material_id = Column(Integer, index=True)  # Không dùng FK: job vẫn còn khi học liệu bị xóa
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_until = Column(DateTime)  # Hạn giữ job của worker đang chạy; quá hạn thì worker khác nhận lại
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StatCounter(Base):
+    """Bộ đếm thống kê được cập nhật cùng transaction với thao tác ghi (xem app/counters.py)"""
+    __tablename__ = "stat_counters"
+    __table_args__ = (
+        Index("ix_stat_counters_name_bucket", "name", "bucket", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)  # materials, materials_by_day, materials_by_uploader, ...
+    bucket = Column(String, nullable=False, default="")  # Ngày (YYYY-MM-DD), id người dùng/khoa, "" = tổng
+    value = Column(Integer, nullable=False, default=0)
+
+class MaterialDailyStat(Base):
+    """Số học liệu / file theo ngày đăng, khoa, người đăng và loại file (xem app/daily_stats.py)"""
+    __tablename__ = "material_daily_stats"
+    __table_args__ = (
+        Index("ix_material_daily_stats_key", "day", "department_id", "uploader_id", "file_type", unique=True),
+        Index("ix_material_daily_stats_department_day", "department_id", "day"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)  # Ngày đăng (theo created_at)
+    department_id = Column(Integer, nullable=False)  # Không dùng FK, giống stat_counters
+    uploader_id = Column(Integer, nullable=False)
+    file_type = Column(String, nullable=False, default="")  # "" = số học liệu, còn lại = số file loại đó
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,152 @@
+"""
+Bộ nhớ đệm nội dung xem trước DOCX/PPTX.
+
+Preview chỉ phụ thuộc vào nội dung file nên được lưu theo SHA-256 của file
+(file cũ chưa có hash dùng đường dẫn + mtime + kích thước). JSON được tạo một lần,
+ghi vào PREVIEW_CACHE_DIR và giữ thêm một LRU giới hạn trong bộ nhớ; ETag của
+phản hồi chính là khóa này nên trình duyệt nhận 304 khi xem lại.
+Khi file bị xóa khỏi kho (tham chiếu cuối cùng), bản preview cũng bị xóa.
+
+    PREVIEW_CACHE_DIR=cache/previews
+    PREVIEW_CACHE_ENTRIES=128     Số preview tối đa giữ trong bộ nhớ
+"""
+
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+from dotenv import load_dotenv
+from app.models.models import MaterialFile
+from app.previews import build_preview
+from app.storage import to_disk_path
+import asyncio
+import hashlib
+import orjson
+import os
+import threading
+import uuid
+
+load_dotenv()
+
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR", "cache/previews")
+PREVIEW_CACHE_ENTRIES = int(os.getenv("PREVIEW_CACHE_ENTRIES", "128"))
+
+# Tăng khi định dạng JSON của build_preview thay đổi để bỏ các bản cũ
+PREVIEW_FORMAT_VERSION = 1
+
+class CachedPreview:
+    def __init__(self, key: str, body: bytes, last_modified: float):
+        self.key = key
+        self.body = body
+        self.last_modified = last_modified
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.key}"'
+
+def preview_key(material_file: MaterialFile) -> Optional[str]:
+    """Khóa cache theo phiên bản file; None nếu file không còn trên đĩa."""
+    if material_file.content_hash:
+        return f"{material_file.content_hash}-v{PREVIEW_FORMAT_VERSION}"
+
+    try:
+        stat = os.stat(to_disk_path(material_file.path))
+    except OSError:
+        return None
+    raw = f"{material_file.path}:{stat.st_mtime_ns}:{stat.st_size}"
+    return f"{hashlib.sha256(raw.encode()).hexdigest()}-v{PREVIEW_FORMAT_VERSION}"
+
+class PreviewCache:
+    def __init__(self, cache_dir: str = PREVIEW_CACHE_DIR, max_entries: int = PREVIEW_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedPreview]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Dict[str, asyncio.Future] = {}
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, entry: CachedPreview):
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, key: str) -> Optional[CachedPreview]:
+        """Tìm trong bộ nhớ rồi trên đĩa."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            last_modified = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        entry = CachedPreview(key, body, last_modified)
+        self._remember(entry)
+        return entry
+
+    def store(self, key: str, data: dict) -> CachedPreview:
+        body = orjson.dumps(data)
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Ghi file tạm rồi đổi tên để không ai đọc phải file ghi dở
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(body)
+        os.replace(temp_path, path)
+
+        entry = CachedPreview(key, body, os.path.getmtime(path))
+        self._remember(entry)
+        return entry
+
+    def invalidate(self, keys: Iterable[str]):
+        for key in keys:
+            with self._lock:
+                self._entries.pop(key, None)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    async def get_or_build(
+        self,
+        key: str,
+        disk_path: str,
+        run_cpu: Callable[..., Awaitable[dict]]
+    ) -> CachedPreview:
+        """
+        Trả về preview đã cache hoặc tạo mới bằng run_cpu(build_preview, disk_path).
+        Nhiều request cùng lúc cho một file chỉ tạo preview một lần.
+        """
+        entry = await run_in_threadpool(self.load, key)
+        if entry is not None:
+            return entry
+
+        pending = self._building.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            data = await run_cpu(build_preview, disk_path)
+            entry = await run_in_threadpool(self.store, key, data)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Tránh cảnh báo "exception was never retrieved"
+            raise
+        finally:
+            del self._building[key]
+
+preview_cache = PreviewCache()
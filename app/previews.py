@@ -0,0 +1,78 @@
+"""
+Đọc nội dung xem trước của file DOCX/PPTX (5 trang/slide đầu).
+
+Các hàm ở đây là hàm cấp module, không dùng database, để có thể chạy trong
+tiến trình worker của hàng đợi công việc (ProcessPoolExecutor).
+"""
+
+from docx import Document
+from pptx import Presentation
+import os
+
+PREVIEW_EXTENSIONS = {'.docx', '.pptx'}
+
+def build_docx_preview(file_path: str) -> dict:
+    print(f"[PREVIEW] Reading DOCX file: {file_path}")
+    doc = Document(file_path)
+    paragraphs = []
+    page_count = 0
+    max_pages = 5
+
+    # Estimate pages (rough estimate: ~40 paragraphs per page)
+    for i, para in enumerate(doc.paragraphs):
+        if page_count >= max_pages:
+            break
+        paragraphs.append({
+            'text': para.text,
+            'style': para.style.name if para.style else 'Normal'
+        })
+        if i % 40 == 0 and i > 0:
+            page_count += 1
+
+    print(f"[PREVIEW] Successfully read DOCX: {len(paragraphs)} paragraphs")
+    return {
+        'type': 'docx',
+        'total_paragraphs': len(doc.paragraphs),
+        'preview_paragraphs': len(paragraphs),
+        'paragraphs': paragraphs,
+        'estimated_pages': len(doc.paragraphs) // 40 + 1
+    }
+
+def build_pptx_preview(file_path: str) -> dict:
+    print(f"[PREVIEW] Reading PPTX file: {file_path}")
+    prs = Presentation(file_path)
+    slides_data = []
+
+    for i, slide in enumerate(prs.slides):
+        if i >= 5:  # Only first 5 slides
+            break
+
+        slide_content = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                slide_content.append({
+                    'text': shape.text,
+                    'type': str(shape.shape_type) if hasattr(shape, 'shape_type') else 'UNKNOWN'
+                })
+
+        slides_data.append({
+            'slide_number': i + 1,
+            'content': slide_content
+        })
+
+    print(f"[PREVIEW] Successfully read PPTX: {len(slides_data)} slides")
+    return {
+        'type': 'pptx',
+        'total_slides': len(prs.slides),
+        'preview_slides': len(slides_data),
+        'slides': slides_data
+    }
+
+def build_preview(file_path: str) -> dict:
+    """Preview theo đuôi file; ValueError nếu không hỗ trợ."""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.docx':
+        return build_docx_preview(file_path)
+    if ext == '.pptx':
+        return build_pptx_preview(file_path)
+    raise ValueError(f"Unsupported preview type: {ext}")
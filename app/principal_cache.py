@@ -0,0 +1,80 @@
+"""
+Cache người dùng đã xác thực theo token, để get_current_user không phải truy vấn
+bảng users ở mỗi request.
+
+Mỗi mục lưu các cột của User (không giữ đối tượng gắn với session) và hết hạn sau
+PRINCIPAL_CACHE_SECONDS giây hoặc khi token hết hạn, tùy điều kiện nào đến trước.
+Khi quyền của người dùng bị đổi hoặc người dùng bị xóa, mọi mục của người đó bị
+xóa ngay, nhưng chỉ trong tiến trình xử lý request đó.
+
+Giới hạn: cache nằm trong bộ nhớ từng tiến trình. Khi chạy nhiều worker (uvicorn
+--workers, nhiều instance), các worker khác vẫn dùng quyền cũ của người dùng bị hạ
+quyền/bị xóa tới tối đa PRINCIPAL_CACHE_SECONDS giây. Mặc định vì vậy để ngắn (5 giây,
+đủ gộp các request dồn dập của một trang); đặt 0 để tắt cache khi cần thu hồi quyền
+tức thì trên mọi worker.
+
+    PRINCIPAL_CACHE_SECONDS=5
+    PRINCIPAL_CACHE_ENTRIES=2048
+"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from app.models.models import User
+import os
+import threading
+import time
+
+load_dotenv()
+
+PRINCIPAL_CACHE_SECONDS = float(os.getenv("PRINCIPAL_CACHE_SECONDS", "5"))
+PRINCIPAL_CACHE_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_ENTRIES", "2048"))
+
+USER_FIELDS = ("id", "username", "email", "full_name", "hashed_password", "role", "created_at")
+
+class PrincipalCache:
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_SECONDS, max_entries: int = PRINCIPAL_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[User]:
+        """User (tạm, không gắn session) của token, hoặc None nếu chưa cache/hết hạn."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+
+        return User(**values)
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        if self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        values = {field: getattr(user, field) for field in USER_FIELDS}
+        with self._lock:
+            self._entries[token] = (expires_at, values)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [token for token, (_, values) in self._entries.items() if values["id"] == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,105 @@
+"""
+Cache dữ liệu tra cứu (danh sách khoa, ...) dùng chung cho trang HTML và API.
+
+Các bảng nhỏ, hầu như không đổi được nạp toàn bộ vào bộ nhớ khi khởi động; các lần
+render trang và /api/departments đọc từ bộ nhớ mà không truy vấn database.
+
+Mỗi bảng có một số phiên bản trong tiến trình: khi một session commit thay đổi trên
+bảng đó (thêm/sửa/xóa qua ORM), phiên bản tăng và lần đọc sau nạp lại. Thay đổi từ
+tiến trình khác (worker khác, manage.py, sửa trực tiếp database) được cập nhật sau
+tối đa REFERENCE_CACHE_SECONDS giây.
+
+    REFERENCE_CACHE_SECONDS=300
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from app.models.models import Department
+import hashlib
+import json
+import os
+import threading
+import time
+
+load_dotenv()
+
+REFERENCE_CACHE_SECONDS = float(os.getenv("REFERENCE_CACHE_SECONDS", "300"))
+
+class Snapshot(NamedTuple):
+    version: int
+    loaded_at: float
+    rows: List[dict]
+    by_id: Dict[int, dict]
+    etag: str
+
+class ReferenceTable:
+    """Toàn bộ một bảng tra cứu nhỏ (các cột fields) giữ trong bộ nhớ."""
+
+    def __init__(self, model, fields: Tuple[str, ...], ttl: float = REFERENCE_CACHE_SECONDS):
+        self.model = model
+        self.fields = fields
+        self.ttl = ttl
+        self._version = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _fresh(self) -> Optional[Snapshot]:
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self._version:
+            return None
+        if snapshot.loaded_at + self.ttl < time.monotonic():
+            return None
+        return snapshot
+
+    def load(self, db: Session) -> Snapshot:
+        """Nạp lại từ database (session đồng bộ, hoặc qua AsyncSession.run_sync)."""
+        version = self._version
+        columns = [getattr(self.model, field) for field in self.fields]
+        rows = [dict(zip(self.fields, row)) for row in db.query(*columns).order_by(self.model.id)]
+
+        # ETag theo nội dung: giống nhau giữa các tiến trình có cùng dữ liệu
+        digest = hashlib.sha1(json.dumps(rows, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        snapshot = Snapshot(version, time.monotonic(), rows, {row["id"]: row for row in rows}, f'"r{digest[:16]}"')
+
+        with self._lock:
+            # Không ghi đè nếu bảng vừa bị sửa trong lúc đang nạp
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def get_sync(self, db: Session) -> Snapshot:
+        return self._fresh() or self.load(db)
+
+    async def get(self, db: AsyncSession) -> Snapshot:
+        return self._fresh() or await db.run_sync(self.load)
+
+departments = ReferenceTable(Department, ("id", "code", "name", "description"))
+
+TABLES = {Department: departments}
+
+def load_all(db: Session):
+    for table in TABLES.values():
+        table.load(db)
+
+@event.listens_for(Session, "after_flush")
+def _track_reference_changes(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = TABLES.get(type(obj))
+        if table is not None:
+            session.info.setdefault("reference_tables_changed", set()).add(table)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    for table in session.info.pop("reference_tables_changed", ()):
+        table.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes_after_rollback(session: Session):
+    session.info.pop("reference_tables_changed", None)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Form
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
 from app.models.models import User, UserRole
-from app.auth import verify_password, create_access_token, get_password_hash
+from app import counters
+from app.auth import verify_password_async, create_access_token, get_password_hash_async
 from datetime import timedelta
 from app.auth import ACCESS_TOKEN_EXPIRE_MINUTES
 
@@ -13,11 +15,11 @@ router = APIRouter()
 async def login(
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Tên đăng nhập hoặc mật khẩu không đúng"
@@ -52,12 +54,12 @@ async def register(
     email: str = Form(...),
     full_name: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = await db.scalar(select(User).where(
         (User.username == username) | (User.email == email)
-    ).first()
+    ))
     
     if existing_user:
         raise HTTPException(
@@ -65,7 +67,7 @@ async def register(
             detail="Tên đăng nhập hoặc email đã tồn tại"
         )
     
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     new_user = User(
         username=username,
         email=email,
@@ -75,7 +77,7 @@ async def register(
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.run_sync(counters.user_created)
+    await db.commit()
     
     return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
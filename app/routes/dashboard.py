@@ -1,92 +1,136 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from app.database.database import get_db
-from app.models.models import Material, User, Department
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
+from app.models.models import Material, User
 from app.dependencies import get_current_user
-from datetime import datetime, timedelta
-import json
+from app.serializers import with_relations, serialize_recent_upload
+from app import counters, daily_stats, reference_data
+from app.http_cache import is_not_modified, not_modified, validator_headers, catalog_etag, json_with_etag
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 router = APIRouter()
 
+# Chart label for each file type chosen at upload
+FILE_TYPE_LABELS = {
+    'Tài liệu': 'Tài liệu',
+    'Bài giảng': 'Giảng nghĩa',
+    'Đề cương': 'Đề cương',
+    'Trình chiếu': 'Slide bài giảng'
+}
+
+def count_file_types(
+    db: Session,
+    department_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> dict:
+    """Count files per chart label from the daily rollup"""
+    counts = {label: 0 for label in FILE_TYPE_LABELS.values()}
+    
+    for file_type, count in daily_stats.totals_by(db, "file_type", start, end, department_id).items():
+        counts[FILE_TYPE_LABELS.get(file_type, 'Tài liệu')] += count
+    
+    return counts
+
+def top_uploaders(
+    db: Session,
+    limit: int,
+    department_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> list:
+    """Uploaders with the most materials, from the daily rollup"""
+    by_uploader = daily_stats.totals_by(db, "uploader_id", start, end, department_id)
+    top = sorted(by_uploader.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    usernames = dict(db.query(User.id, User.username).filter(
+        User.id.in_([user_id for user_id, _ in top])
+    ).all())
+    
+    return [{'username': usernames.get(user_id, 'Unknown'), 'count': count} for user_id, count in top]
+
+def statistics_range(date_from: Optional[date], date_to: Optional[date], granularity: str):
+    """
+    Validate the requested range. Returns (start, end) for totals (None = unbounded)
+    and the series periods; without a range the series covers the last 12 months
+    """
+    series_end = date_to or datetime.now().date()
+    series_start = date_from or series_end - timedelta(days=365)
+    try:
+        daily_stats.periods(series_start, series_end, granularity)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Khoảng thời gian hoặc granularity không hợp lệ "
+                   f"(day/week/month, tối đa {daily_stats.MAX_SERIES_POINTS} kỳ)"
+        )
+    return (date_from, date_to), (series_start, series_end)
+
 @router.get("/api/dashboard/stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get dashboard statistics"""
-    
-    # Total materials
-    total_materials = db.query(Material).count()
-    
-    # Total users
-    total_users = db.query(User).count()
-    
-    # Total departments
-    total_departments = db.query(Department).count()
-    
-    # Materials uploaded today
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    materials_today = db.query(Material).filter(
-        Material.created_at >= today_start
-    ).count()
+    """Get dashboard statistics (served from precomputed counters, see app/counters.py)"""
+    # Statistics depend on the data version and on today's date (relative ranges)
+    etag = catalog_etag(request, await counters.catalog_version(db), datetime.now().date())
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
+    
+    # Keyed by ETag so a cached payload always matches the data version it was built from
+    payload = counters.dashboard_cache.get(etag)
+    if payload is None:
+        payload = await db.run_sync(build_dashboard_stats)
+        counters.dashboard_cache.put(etag, payload)
+    return json_with_etag(payload, etag)
+
+def build_dashboard_stats(db: Session) -> dict:
+    # Day buckets use the stored created_at date, same boundary as comparing against local midnight
+    today = datetime.now().date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
     
-    # Materials uploaded this week
-    week_start = today_start - timedelta(days=today_start.weekday())
-    materials_this_week = db.query(Material).filter(
-        Material.created_at >= week_start
-    ).count()
+    by_day = counters.get_values(db, counters.MATERIALS_BY_DAY, counters.days_since(min(week_start, month_start), today))
     
-    # Materials uploaded this month
-    month_start = today_start.replace(day=1)
-    materials_this_month = db.query(Material).filter(
-        Material.created_at >= month_start
-    ).count()
+    def uploads_since(start):
+        return sum(by_day.get(day, 0) for day in counters.days_since(start, today))
     
-    # Recent uploads (last 5)
-    recent_materials = db.query(Material).order_by(
+    # Recent uploads (last 5) - uploader and department loaded in the same query
+    recent_materials = with_relations(db.query(Material), include_files=False).order_by(
         Material.created_at.desc()
     ).limit(5).all()
     
-    recent_uploads = []
-    for material in recent_materials:
-        uploader = db.query(User).filter(User.id == material.uploader_id).first()
-        department = db.query(Department).filter(Department.id == material.department_id).first()
-        
-        recent_uploads.append({
-            'id': material.id,
-            'title': material.title,
-            'subject': material.subject,
-            'uploader': uploader.username if uploader else 'Unknown',
-            'department': department.name if department else 'Unknown',
-            'created_at': material.created_at.isoformat()
-        })
+    recent_uploads = [serialize_recent_upload(material) for material in recent_materials]
     
     # Top uploaders (top 5)
-    top_uploaders_data = db.query(
-        User.username,
-        func.count(Material.id).label('count')
-    ).join(Material, Material.uploader_id == User.id).group_by(
-        User.username
-    ).order_by(func.count(Material.id).desc()).limit(5).all()
+    top_uploaders_data = counters.top_buckets(db, counters.MATERIALS_BY_UPLOADER, 5)
+    usernames = dict(db.query(User.id, User.username).filter(
+        User.id.in_([int(user_id) for user_id, _ in top_uploaders_data])
+    ).all())
     
-    top_uploaders = [{'username': username, 'count': count} for username, count in top_uploaders_data]
+    top_uploaders = [
+        {'username': usernames.get(int(user_id), 'Unknown'), 'count': count}
+        for user_id, count in top_uploaders_data
+    ]
     
     # Materials by department
-    materials_by_dept = db.query(
-        Department.name,
-        func.count(Material.id).label('count')
-    ).join(Material, Material.department_id == Department.id).group_by(Department.name).all()
+    materials_by_dept = counters.top_buckets(db, counters.MATERIALS_BY_DEPARTMENT, 1000)
+    department_names = {d['id']: d['name'] for d in reference_data.departments.get_sync(db).rows}
     
-    departments_data = [{'department': dept, 'count': count} for dept, count in materials_by_dept]
+    departments_data = [
+        {'department': department_names.get(int(dept_id), 'Unknown'), 'count': count}
+        for dept_id, count in sorted(materials_by_dept, key=lambda row: department_names.get(int(row[0]), ''))
+    ]
     
     return {
-        'total_materials': total_materials,
-        'total_users': total_users,
-        'total_departments': total_departments,
-        'materials_today': materials_today,
-        'materials_this_week': materials_this_week,
-        'materials_this_month': materials_this_month,
+        'total_materials': counters.get_value(db, counters.MATERIALS),
+        'total_users': counters.get_value(db, counters.USERS),
+        'total_departments': counters.get_value(db, counters.DEPARTMENTS),
+        'materials_today': uploads_since(today),
+        'materials_this_week': uploads_since(week_start),
+        'materials_this_month': uploads_since(month_start),
         'recent_uploads': recent_uploads,
         'top_uploaders': top_uploaders,
         'departments_data': departments_data
@@ -94,158 +138,82 @@ async def get_dashboard_stats(
 
 @router.get("/api/statistics/department/{dept_id}")
 async def get_department_statistics(
+    request: Request,
     dept_id: int,
-    db: Session = Depends(get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    granularity: str = "month",
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get statistics for a specific department"""
+    """Get statistics for a specific department (served from the daily rollup, see app/daily_stats.py)"""
+    (start, end), (series_start, series_end) = statistics_range(date_from, date_to, granularity)
+    
+    # Statistics depend on the data version and on today's date (relative ranges)
+    etag = catalog_etag(request, await counters.catalog_version(db), datetime.now().date())
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
     
     # Verify department exists
-    department = db.query(Department).filter(Department.id == dept_id).first()
+    department = (await reference_data.departments.get(db)).by_id.get(dept_id)
     if not department:
         return {"error": "Department not found"}
     
-    # Total materials for department
-    total_materials = db.query(Material).filter(
-        Material.department_id == dept_id
-    ).count()
-    
-    # Materials by file type (count files in files_json)
-    materials = db.query(Material).filter(
-        Material.department_id == dept_id
-    ).all()
-    
-    file_type_counts = {
-        'Tài liệu': 0,
-        'Giảng nghĩa': 0,
-        'Đề cương': 0,
-        'Slide bài giảng': 0
-    }
-    
-    for material in materials:
-        files = json.loads(material.files_json)
-        for file_info in files:
-            category = file_info.get('category', 'Tài liệu')
-            if category in file_type_counts:
-                file_type_counts[category] += 1
-    
-    # Materials by month (last 12 months)
-    twelve_months_ago = datetime.now() - timedelta(days=365)
-    materials_by_month = db.query(
-        extract('year', Material.created_at).label('year'),
-        extract('month', Material.created_at).label('month'),
-        func.count(Material.id).label('count')
-    ).filter(
-        Material.department_id == dept_id,
-        Material.created_at >= twelve_months_ago
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    
-    # Format month data
-    month_labels = []
-    month_counts = []
-    for year, month, count in materials_by_month:
-        month_name = datetime(int(year), int(month), 1).strftime('%m/%Y')
-        month_labels.append(month_name)
-        month_counts.append(count)
-    
-    # Top uploaders in department
-    top_uploaders = db.query(
-        User.username,
-        func.count(Material.id).label('count')
-    ).join(Material, Material.uploader_id == User.id).filter(
-        Material.department_id == dept_id
-    ).group_by(User.username).order_by(func.count(Material.id).desc()).limit(5).all()
-    
-    uploaders_data = [{'username': username, 'count': count} for username, count in top_uploaders]
-    
-    return {
-        'department_name': department.name,
-        'department_code': department.code,
-        'total_materials': total_materials,
-        'file_type_counts': file_type_counts,
-        'month_labels': month_labels,
-        'month_counts': month_counts,
-        'top_uploaders': uploaders_data
-    }
+    def build(db: Session) -> dict:
+        month_labels, month_counts = daily_stats.series(db, series_start, series_end, granularity, dept_id)
+        return {
+            'department_name': department['name'],
+            'department_code': department['code'],
+            'total_materials': daily_stats.total(db, start, end, dept_id),
+            'file_type_counts': count_file_types(db, dept_id, start, end),
+            'month_labels': month_labels,
+            'month_counts': month_counts,
+            'top_uploaders': top_uploaders(db, 5, dept_id, start, end),
+            'granularity': granularity,
+            'date_from': series_start.isoformat(),
+            'date_to': series_end.isoformat()
+        }
+    
+    return json_with_etag(await db.run_sync(build), etag)
 
 @router.get("/api/statistics/overall")
 async def get_overall_statistics(
-    db: Session = Depends(get_db),
+    request: Request,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    granularity: str = "month",
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get overall system statistics"""
-    
-    # Total materials
-    total_materials = db.query(Material).count()
-    
-    # Materials by department (all departments)
-    departments_data = db.query(
-        Department.code,
-        Department.name,
-        func.count(Material.id).label('count')
-    ).outerjoin(Material, Material.department_id == Department.id).group_by(
-        Department.code, Department.name
-    ).order_by(Department.code).all()
-    
-    dept_comparison = []
-    for code, name, count in departments_data:
-        dept_comparison.append({
-            'code': code,
-            'name': name,
-            'count': count if count else 0
-        })
-    
-    # Materials uploaded over time (last 12 months - all departments)
-    twelve_months_ago = datetime.now() - timedelta(days=365)
-    materials_by_month = db.query(
-        extract('year', Material.created_at).label('year'),
-        extract('month', Material.created_at).label('month'),
-        func.count(Material.id).label('count')
-    ).filter(
-        Material.created_at >= twelve_months_ago
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    
-    # Format month data
-    growth_labels = []
-    growth_counts = []
-    for year, month, count in materials_by_month:
-        month_name = datetime(int(year), int(month), 1).strftime('%m/%Y')
-        growth_labels.append(month_name)
-        growth_counts.append(count)
-    
-    # Total file types across all departments
-    all_materials = db.query(Material).all()
-    
-    overall_file_types = {
-        'Tài liệu': 0,
-        'Giảng nghĩa': 0,
-        'Đề cương': 0,
-        'Slide bài giảng': 0
-    }
-    
-    for material in all_materials:
-        files = json.loads(material.files_json)
-        for file_info in files:
-            category = file_info.get('category', 'Tài liệu')
-            if category in overall_file_types:
-                overall_file_types[category] += 1
-    
-    # Top uploaders (all departments)
-    top_uploaders = db.query(
-        User.username,
-        func.count(Material.id).label('count')
-    ).join(Material, Material.uploader_id == User.id).group_by(
-        User.username
-    ).order_by(func.count(Material.id).desc()).limit(10).all()
-    
-    uploaders_data = [{'username': username, 'count': count} for username, count in top_uploaders]
-    
-    return {
-        'total_materials': total_materials,
-        'dept_comparison': dept_comparison,
-        'growth_labels': growth_labels,
-        'growth_counts': growth_counts,
-        'overall_file_types': overall_file_types,
-        'top_uploaders': uploaders_data
-    }
-
+    """Get overall system statistics (served from the daily rollup, see app/daily_stats.py)"""
+    (start, end), (series_start, series_end) = statistics_range(date_from, date_to, granularity)
+    
+    # Statistics depend on the data version and on today's date (relative ranges)
+    etag = catalog_etag(request, await counters.catalog_version(db), datetime.now().date())
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
+    
+    departments = sorted((await reference_data.departments.get(db)).rows, key=lambda d: d['code'])
+    
+    def build(db: Session) -> dict:
+        # Materials by department (all departments, including empty ones)
+        by_department = daily_stats.totals_by(db, "department_id", start, end)
+        dept_comparison = [
+            {'code': d['code'], 'name': d['name'], 'count': by_department.get(d['id'], 0)}
+            for d in departments
+        ]
+        
+        growth_labels, growth_counts = daily_stats.series(db, series_start, series_end, granularity)
+        return {
+            'total_materials': daily_stats.total(db, start, end),
+            'dept_comparison': dept_comparison,
+            'growth_labels': growth_labels,
+            'growth_counts': growth_counts,
+            'overall_file_types': count_file_types(db, None, start, end),
+            'top_uploaders': top_uploaders(db, 10, None, start, end),
+            'granularity': granularity,
+            'date_from': series_start.isoformat(),
+            'date_to': series_end.isoformat()
+        }
+    
+    return json_with_etag(await db.run_sync(build), etag)
@@ -1,139 +1,282 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.database.database import get_db
-from app.models.models import Material, Department, User, UserRole
+from app.database.database import get_async_db
+from app.models.models import Material, MaterialFile, Department, User, UserRole
 from app.dependencies import get_current_user
+from app.text_store import delete_extracted_texts
+from app.storage import (
+    save_uploads, discard_new_uploads, discard_replaced_uploads, release_file, remove_unreferenced, to_disk_path, UploadTooLarge, UploadLost
+)
+from app import search_index, counters, reference_data
+from app.serializers import with_relations, serialize_material
+from app.previews import PREVIEW_EXTENSIONS
+from app.preview_cache import preview_cache, preview_key
+from app.http_cache import is_not_modified, not_modified, validator_headers, catalog_etag, json_with_etag
+from app.downloads import RangeFileResponse, RangeNotSatisfiable, parse_range, content_disposition
+from app.jobs import job_runner, material_processing_status
+from app.material_export import EXPORT_FORMATS, stream_export
+from app.material_import import insert_material, import_archive, InvalidImport
+from app.suggestions import suggestion_index, FIELDS as SUGGESTION_FIELDS, DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+from app.material_query import (
+    MaterialFilter, SORT_KEYS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+    encode_cursor, decode_cursor, sort_expression, paginate, facet_counts, parse_facets, FACETS
+)
 import os
-import shutil
-import json
-from datetime import datetime
-from docx import Document
-from pptx import Presentation
-from PyPDF2 import PdfReader
+from datetime import date, datetime
 
 router = APIRouter()
 
-UPLOAD_DIR = "app/static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-def extract_text_from_file(file_path: str) -> str:
-    """Extract text content from PDF, DOCX, or PPTX files"""
-    try:
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        if ext == '.pdf':
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        
-        elif ext == '.docx':
-            doc = Document(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text
-        
-        elif ext == '.pptx':
-            prs = Presentation(file_path)
-            text = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            return text
-        
-        return ""
-    except Exception as e:
-        print(f"Error extracting text from {file_path}: {e}")
-        return ""
-
 @router.get("/materials")
 async def get_materials(
+    request: Request,
     department_id: Optional[int] = None,
     search: Optional[str] = None,
     uploader: Optional[str] = None,
     search_content: Optional[str] = None,
-    db: Session = Depends(get_db),
+    subject: Optional[str] = None,
+    topic: Optional[str] = None,
+    uploader_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    file_type: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    facets: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Material)
-    
-    if department_id:
-        query = query.filter(Material.department_id == department_id)
-    
-    if uploader:
-        # Tìm kiếm theo tên người đăng
-        uploader_filter = f"%{uploader}%"
-        query = query.join(User).filter(User.full_name.like(uploader_filter))
-    
-    materials = query.order_by(Material.created_at.desc()).all()
-    
-    # Tìm kiếm theo nội dung file nếu được bật
-    if search and search_content == 'true':
-        filtered_materials = []
-        search_lower = search.lower()
-        
-        for m in materials:
-            # Kiểm tra metadata trước
-            if (search_lower in m.title.lower() or 
-                search_lower in m.subject.lower() or 
-                (m.topic and search_lower in m.topic.lower())):
-                filtered_materials.append(m)
-                continue
-            
-            # Tìm trong nội dung file
-            files = json.loads(m.files_json)
-            found = False
-            for file_info in files:
-                file_path = file_info['path'].replace('/static/', 'app/static/')
-                if os.path.exists(file_path):
-                    content = extract_text_from_file(file_path)
-                    if search_lower in content.lower():
-                        filtered_materials.append(m)
-                        found = True
-                        break
-            
-        materials = filtered_materials
-    elif search:
-        # Tìm kiếm thông thường theo metadata
-        search_filter = f"%{search}%"
-        materials = [m for m in materials if (
-            search.lower() in m.title.lower() or
-            search.lower() in m.subject.lower() or
-            (m.topic and search.lower() in m.topic.lower())
-        )]
+    etag = catalog_etag(request, await counters.catalog_version(db))
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
     
-    return {
-        "materials": [
-            {
-                "id": m.id,
-                "title": m.title,
-                "subject": m.subject,
-                "topic": m.topic,
-                "files": json.loads(m.files_json),
-                "department": {
-                    "id": m.department.id,
-                    "code": m.department.code,
-                    "name": m.department.name
-                },
-                "uploader": {
-                    "id": m.uploader.id,
-                    "full_name": m.uploader.full_name
-                },
-                "created_at": m.created_at.isoformat()
-            }
-            for m in materials
-        ]
+    material_filter = MaterialFilter(
+        db,
+        department_id=department_id,
+        search=search,
+        search_content=search_content == 'true',
+        uploader=uploader,
+        subject=subject,
+        topic=topic,
+        uploader_name=uploader_name,
+        date_from=date_from,
+        date_to=date_to,
+        file_type=file_type
+    )
+    
+    # Mặc định: xếp theo độ liên quan khi tìm kiếm, ngược lại mới nhất trước
+    if sort is None:
+        sort = "relevance" if material_filter.hits is not None else "created_at"
+    if sort not in SORT_KEYS or (sort == "relevance" and material_filter.hits is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Kiểu sắp xếp không hợp lệ"
+        )
+    if order is None:
+        order = "desc" if sort == "created_at" else "asc"
+    if order not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Thứ tự sắp xếp không hợp lệ"
+        )
+    
+    try:
+        facet_names = parse_facets(facets)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Facet không hợp lệ"
+        )
+    
+    cursor_value = None
+    if cursor:
+        try:
+            cursor_value = decode_cursor(cursor, sort, order)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor không hợp lệ"
+            )
+    
+    query = with_relations(select(Material))
+    rank_column = None
+    if sort == "relevance":
+        # Join với kết quả tìm kiếm để lấy điểm xếp hạng (thay cho điều kiện IN)
+        fts = material_filter.hits
+        query = material_filter.apply(query, exclude=("search",)).join(
+            fts, fts.c.material_id == Material.id
+        )
+        rank_column = fts.c.rank
+    else:
+        query = material_filter.apply(query)
+        if sort == "uploader":
+            query = query.join(User, Material.uploader_id == User.id)
+    
+    sort_column = sort_expression(sort, rank_column)
+    rows, has_more = await paginate(db, query.add_columns(sort_column), sort_column, order, cursor_value, limit)
+    materials = [m for m, _ in rows]
+    
+    next_cursor = None
+    if has_more:
+        last_material, last_value = rows[-1]
+        next_cursor = encode_cursor(sort, order, last_value, last_material.id)
+    
+    snippets = {}
+    if material_filter.match:
+        snippets = await db.run_sync(search_index.get_snippets, material_filter.match, [m.id for m in materials])
+    
+    result = []
+    for m, sort_value in rows:
+        item = serialize_material(m)
+        if search:
+            item["rank"] = sort_value if sort == "relevance" else None
+            item["snippet"] = snippets.get(m.id)
+        result.append(item)
+    
+    response = {
+        "materials": result,
+        "next_cursor": next_cursor,
+        "sort": sort,
+        "order": order
     }
+    
+    # Tổng số và facet chỉ tính ở trang đầu (một truy vấn), các trang sau chỉ tốn một truy vấn có giới hạn
+    if cursor is None:
+        response["total"], response["facets"] = await facet_counts(db, material_filter, facet_names)
+    
+    return json_with_etag(response, etag)
+
+@router.get("/materials/facets")
+async def get_material_facets(
+    request: Request,
+    facets: Optional[str] = None,
+    department_id: Optional[int] = None,
+    search: Optional[str] = None,
+    uploader: Optional[str] = None,
+    search_content: Optional[str] = None,
+    subject: Optional[str] = None,
+    topic: Optional[str] = None,
+    uploader_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    file_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Total and facet counts for the current filter set, without the material rows"""
+    try:
+        facet_names = parse_facets(facets) if facets is not None else FACETS
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Facet không hợp lệ"
+        )
+    
+    etag = catalog_etag(request, await counters.catalog_version(db))
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
+    
+    material_filter = MaterialFilter(
+        db,
+        department_id=department_id,
+        search=search,
+        search_content=search_content == 'true',
+        uploader=uploader,
+        subject=subject,
+        topic=topic,
+        uploader_name=uploader_name,
+        date_from=date_from,
+        date_to=date_to,
+        file_type=file_type
+    )
+    
+    total, counts = await facet_counts(db, material_filter, facet_names)
+    return json_with_etag({"total": total, "facets": counts}, etag)
+
+@router.get("/materials/suggestions")
+async def get_suggestions(
+    q: str = "",
+    field: Optional[str] = None,
+    limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Served from the in-memory prefix index (app/suggestions.py), no catalog query
+    if field is not None and field not in SUGGESTION_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Trường gợi ý không hợp lệ"
+        )
+    
+    fields = (field,) if field else SUGGESTION_FIELDS
+    return {"suggestions": await suggestion_index.suggest(db, q, fields, limit)}
+
+@router.get("/materials/export")
+async def export_materials(
+    export_format: str = Query("ndjson", alias="format"),
+    department_id: Optional[int] = None,
+    search: Optional[str] = None,
+    uploader: Optional[str] = None,
+    search_content: Optional[str] = None,
+    subject: Optional[str] = None,
+    topic: Optional[str] = None,
+    uploader_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    file_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the whole (filtered) catalog as NDJSON or CSV, see app/material_export.py"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Định dạng xuất không hợp lệ (ndjson hoặc csv)"
+        )
+    
+    material_filter = MaterialFilter(
+        db,
+        department_id=department_id,
+        search=search,
+        search_content=search_content == 'true',
+        uploader=uploader,
+        subject=subject,
+        topic=topic,
+        uploader_name=uploader_name,
+        date_from=date_from,
+        date_to=date_to,
+        file_type=file_type
+    )
+    
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"hoc-lieu-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    return StreamingResponse(
+        stream_export(material_filter, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Cache-Control": "no-store"
+        }
+    )
 
 @router.get("/materials/{material_id}")
 async def get_material_detail(
+    request: Request,
     material_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    material = db.query(Material).filter(Material.id == material_id).first()
+    etag = catalog_etag(request, await counters.catalog_version(db))
+    if is_not_modified(request, etag):
+        return not_modified(validator_headers(etag))
+    
+    material = await db.scalar(with_relations(select(Material)).where(Material.id == material_id))
     
     if not material:
         raise HTTPException(
@@ -141,25 +284,7 @@ async def get_material_detail(
             detail="Không tìm thấy học liệu"
         )
     
-    return {
-        "id": material.id,
-        "title": material.title,
-        "subject": material.subject,
-        "topic": material.topic,
-        "files": json.loads(material.files_json),
-        "department": {
-            "id": material.department.id,
-            "code": material.department.code,
-            "name": material.department.name
-        },
-        "uploader": {
-            "id": material.uploader.id,
-            "full_name": material.uploader.full_name,
-            "email": material.uploader.email
-        },
-        "created_at": material.created_at.isoformat(),
-        "updated_at": material.updated_at.isoformat()
-    }
+    return json_with_etag(serialize_material(material, detail=True), etag)
 
 @router.post("/materials")
 async def create_material(
@@ -171,7 +296,7 @@ async def create_material(
     baigiang_files: List[UploadFile] = File(default=[]),
     decuong_files: List[UploadFile] = File(default=[]),
     trinhchieu_files: List[UploadFile] = File(default=[]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if user is superuser or admin
@@ -182,7 +307,6 @@ async def create_material(
         )
     
     # Collect all files
-    all_files = []
     file_groups = [
         ("Tài liệu", tailieu_files),
         ("Bài giảng", baigiang_files),
@@ -198,51 +322,124 @@ async def create_material(
             detail="Vui lòng chọn ít nhất một file"
         )
     
-    # Save files
-    for file_type, files in file_groups:
-        if files:
-            for file in files:
-                if file.filename:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                    file_extension = os.path.splitext(file.filename)[1]
-                    unique_filename = f"{timestamp}_{file.filename}"
-                    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-                    
-                    with open(file_path, "wb") as buffer:
-                        shutil.copyfileobj(file.file, buffer)
-                    
-                    all_files.append({
-                        "type": file_type,
-                        "path": f"/static/uploads/{unique_filename}",
-                        "name": file.filename
-                    })
-    
-    # Create material record
-    new_material = Material(
-        title=title,
-        subject=subject,
-        topic=topic,
-        files_json=json.dumps(all_files, ensure_ascii=False),
-        department_id=department_id,
-        uploader_id=current_user.id
-    )
+    # Save files (streamed in chunks, all files of the form written concurrently)
+    uploads = [
+        (file_type, file)
+        for file_type, files in file_groups if files
+        for file in files if file.filename
+    ]
+    try:
+        saved_files = await save_uploads(uploads)
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=e.message
+        )
+    
+    try:
+        new_material = await db.run_sync(
+            insert_material, saved_files,
+            title=title,
+            subject=subject,
+            topic=topic,
+            department_id=department_id,
+            uploader_id=current_user.id
+        )
+        await db.commit()
+    except UploadLost as e:
+        await db.rollback()
+        await run_in_threadpool(discard_new_uploads, saved_files)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=e.message
+        )
+    except Exception:
+        await db.rollback()
+        await run_in_threadpool(discard_new_uploads, saved_files)
+        raise
     
-    db.add(new_material)
-    db.commit()
-    db.refresh(new_material)
+    await run_in_threadpool(discard_replaced_uploads, saved_files)
+    job_runner.notify()
     
     return {
         "message": "Đăng học liệu thành công",
-        "material_id": new_material.id
+        "material_id": new_material.id,
+        "processing_status": "pending"
     }
 
+@router.post("/materials/import")
+async def import_materials(
+    archive: UploadFile = File(...),
+    manifest: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Bulk import from a ZIP archive + CSV/JSON manifest, see app/material_import.py"""
+    if current_user.role not in [UserRole.SUPERUSER, UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Chỉ superuser và admin mới có quyền đăng học liệu"
+        )
+    
+    # Manifest sent separately; otherwise manifest.csv / manifest.json inside the archive
+    manifest_data = None
+    if manifest is not None and manifest.filename:
+        manifest_data = (await manifest.read(), manifest.filename)
+    
+    # The archive was spooled to a temp file by the form parser; extraction and inserts run in the threadpool
+    try:
+        result = await run_in_threadpool(import_archive, archive.file, current_user.id, manifest_data)
+    except InvalidImport as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message
+        )
+    
+    if result["materials_created"]:
+        job_runner.notify()
+    
+    return result
+
+@router.get("/materials/{material_id}/processing")
+async def get_material_processing(
+    material_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Trạng thái trích xuất nội dung / cập nhật chỉ mục của học liệu vừa đăng"""
+    exists = await db.scalar(select(Material.id).where(Material.id == material_id))
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy học liệu"
+        )
+    
+    return await db.run_sync(material_processing_status, material_id)
+
+def delete_material_records(db: Session, material: Material):
+    """
+    Delete the material and release its files (runs via run_sync). No commit.
+    Returns (disk paths to remove, preview cache keys to drop) once committed.
+    """
+    # Release stored files; bytes are removed only when no other material references them
+    orphaned = [path for f in material.files for path in release_file(db, f)]
+    orphaned_files = [f for f in material.files if to_disk_path(f.path) in orphaned]
+    stale_previews = [key for key in (preview_key(f) for f in orphaned_files) if key]
+    delete_extracted_texts(db, [f.path for f in orphaned_files])
+    search_index.remove_material(db, material.id)
+    counters.material_deleted(db, material)
+    counters.catalog_changed(db)
+    db.delete(material)
+    return orphaned, stale_previews
+
 @router.delete("/materials/{material_id}")
 async def delete_material(
     material_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = await db.scalar(
+        select(Material).options(selectinload(Material.files)).where(Material.id == material_id)
+    )
     
     if not material:
         raise HTTPException(
@@ -263,15 +460,11 @@ async def delete_material(
             detail="Bạn chỉ có thể xóa học liệu của mình"
         )
     
-    # Delete files
-    files = json.loads(material.files_json)
-    for file_info in files:
-        file_path = f"app{file_info['path']}"
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    orphaned, stale_previews = await db.run_sync(delete_material_records, material)
+    await db.commit()
     
-    db.delete(material)
-    db.commit()
+    await run_in_threadpool(remove_unreferenced, orphaned)
+    preview_cache.invalidate(stale_previews)
     
     return {"message": "Xóa học liệu thành công"}
 
@@ -282,11 +475,11 @@ async def update_material(
     subject: str = Form(...),
     topic: str = Form(None),
     department_id: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update material information (metadata only, not files)"""
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = await db.get(Material, material_id)
     
     if not material:
         raise HTTPException(
@@ -308,7 +501,7 @@ async def update_material(
         )
     
     # Check if department exists
-    department = db.query(Department).filter(Department.id == department_id).first()
+    department = await db.get(Department, department_id)
     if not department:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -316,14 +509,16 @@ async def update_material(
         )
     
     # Update material
+    await db.run_sync(counters.material_moved, material, department_id)
     material.title = title
     material.subject = subject
     material.topic = topic
     material.department_id = department_id
     material.updated_at = datetime.now()
+    await db.run_sync(search_index.index_material, material)
+    await db.run_sync(counters.catalog_changed)
     
-    db.commit()
-    db.refresh(material)
+    await db.commit()
     
     return {
         "message": "Cập nhật học liệu thành công",
@@ -338,13 +533,14 @@ async def update_material(
 
 @router.get("/preview/{material_id}/{file_index}")
 async def preview_file(
+    request: Request,
     material_id: int,
     file_index: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Preview DOCX or PPTX file content (first 5 pages/slides)"""
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = await db.scalar(select(Material.id).where(Material.id == material_id))
     
     if not material:
         raise HTTPException(
@@ -352,16 +548,18 @@ async def preview_file(
             detail="Không tìm thấy học liệu"
         )
     
-    files = json.loads(material.files_json)
+    material_file = await db.scalar(select(MaterialFile).where(
+        MaterialFile.material_id == material_id,
+        MaterialFile.position == file_index
+    ))
     
-    if file_index >= len(files):
+    if not material_file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy file"
         )
     
-    file_info = files[file_index]
-    file_path = file_info['path'].replace('/static/', 'app/static/')
+    file_path = to_disk_path(material_file.path)
     
     if not os.path.exists(file_path):
         raise HTTPException(
@@ -369,74 +567,22 @@ async def preview_file(
             detail="File không tồn tại"
         )
     
-    ext = os.path.splitext(file_path)[1].lower()
+    if os.path.splitext(file_path)[1].lower() not in PREVIEW_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chỉ hỗ trợ preview file DOCX và PPTX"
+        )
     
-    try:
-        if ext == '.docx':
-            print(f"[PREVIEW] Reading DOCX file: {file_path}")
-            doc = Document(file_path)
-            paragraphs = []
-            page_count = 0
-            max_pages = 5
-            
-            # Estimate pages (rough estimate: ~40 paragraphs per page)
-            for i, para in enumerate(doc.paragraphs):
-                if page_count >= max_pages:
-                    break
-                paragraphs.append({
-                    'text': para.text,
-                    'style': para.style.name if para.style else 'Normal'
-                })
-                if i % 40 == 0 and i > 0:
-                    page_count += 1
-            
-            print(f"[PREVIEW] Successfully read DOCX: {len(paragraphs)} paragraphs")
-            return {
-                'type': 'docx',
-                'total_paragraphs': len(doc.paragraphs),
-                'preview_paragraphs': len(paragraphs),
-                'paragraphs': paragraphs,
-                'estimated_pages': len(doc.paragraphs) // 40 + 1
-            }
-        
-        elif ext == '.pptx':
-            print(f"[PREVIEW] Reading PPTX file: {file_path}")
-            prs = Presentation(file_path)
-            slides_data = []
-            
-            for i, slide in enumerate(prs.slides):
-                if i >= 5:  # Only first 5 slides
-                    break
-                
-                slide_content = []
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        slide_content.append({
-                            'text': shape.text,
-                            'type': str(shape.shape_type) if hasattr(shape, 'shape_type') else 'UNKNOWN'
-                        })
-                
-                slides_data.append({
-                    'slide_number': i + 1,
-                    'content': slide_content
-                })
-            
-            print(f"[PREVIEW] Successfully read PPTX: {len(slides_data)} slides")
-            return {
-                'type': 'pptx',
-                'total_slides': len(prs.slides),
-                'preview_slides': len(slides_data),
-                'slides': slides_data
-            }
-        
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Chỉ hỗ trợ preview file DOCX và PPTX"
-            )
+    key = preview_key(material_file)
+    if key is not None:
+        # ETag = version of the file, so a client holding it can revalidate without parsing
+        etag = f'"{key}"'
+        if is_not_modified(request, etag):
+            return not_modified(validator_headers(etag))
     
-    except HTTPException:
-        raise
+    try:
+        # Parsed once per file version (worker pool), then served from the preview cache
+        entry = await preview_cache.get_or_build(key, file_path, job_runner.run_cpu)
     except Exception as e:
         print(f"[PREVIEW ERROR] Failed to read file: {file_path}")
         print(f"[PREVIEW ERROR] Error: {str(e)}")
@@ -446,21 +592,97 @@ async def preview_file(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi khi đọc file: {str(e)}"
         )
+    
+    headers = validator_headers(entry.etag, entry.last_modified)
+    if is_not_modified(request, entry.etag, entry.last_modified):
+        return not_modified(headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+@router.api_route("/download/{material_id}/{file_index}", methods=["GET", "HEAD"])
+async def download_file(
+    request: Request,
+    material_id: int,
+    file_index: int,
+    inline: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download a material file (login required) with Range, If-Range and conditional GET support"""
+    material_file = await db.scalar(select(MaterialFile).where(
+        MaterialFile.material_id == material_id,
+        MaterialFile.position == file_index
+    ))
+    
+    if not material_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy file"
+        )
+    
+    file_path = to_disk_path(material_file.path)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File không tồn tại"
+        )
+    
+    # Stored files are content-addressed, so the SHA-256 is a strong validator
+    if material_file.content_hash:
+        etag = f'"{material_file.content_hash}"'
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    
+    headers = validator_headers(etag, stat.st_mtime)
+    headers["Content-Disposition"] = content_disposition(material_file.original_name, inline)
+    
+    if is_not_modified(request, etag, stat.st_mtime):
+        return not_modified(headers)
+    
+    # If-Range: only honour Range when the client's copy is still current
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range not in (etag, headers["Last-Modified"]):
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{stat.st_size}"}
+        )
+    
+    # Count a download once: full responses and the first range of a resumable download.
+    # The catalog version is not bumped here, otherwise every download would expire
+    # all list/detail/statistics ETags; cached download counts may lag until the next write
+    if request.method == "GET" and (byte_range is None or byte_range[0] == 0):
+        await db.execute(
+            update(MaterialFile)
+            .where(MaterialFile.id == material_file.id)
+            .values(download_count=MaterialFile.download_count + 1)
+        )
+        await db.commit()
+    
+    return RangeFileResponse(
+        file_path,
+        stat.st_size,
+        headers,
+        media_type=material_file.mime_type or "application/octet-stream",
+        byte_range=byte_range,
+        send_body=request.method == "GET"
+    )
 
 @router.get("/departments")
 async def get_departments(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    departments = db.query(Department).all()
-    return {
-        "departments": [
-            {
-                "id": d.id,
-                "code": d.code,
-                "name": d.name,
-                "description": d.description
-            }
-            for d in departments
-        ]
-    }
+    # Served from the reference-data cache; the ETag is derived from the cached rows
+    departments = await reference_data.departments.get(db)
+    if is_not_modified(request, departments.etag):
+        return not_modified(validator_headers(departments.etag))
+    
+    return json_with_etag({"departments": departments.rows}, departments.etag)
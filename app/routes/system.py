@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db, pool_stats
+from app.models.models import User, UserRole, Job
+from app.dependencies import get_current_user
+from app.auth import password_hasher
+
+router = APIRouter()
+
+@router.get("/system/stats")
+async def get_system_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Runtime metrics for monitoring (admin only)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Chỉ admin mới có quyền xem thông số hệ thống"
+        )
+    
+    jobs = dict((await db.execute(select(Job.status, func.count(Job.id)).group_by(Job.status))).all())
+    
+    return {
+        "password_hashing": password_hasher.stats(),
+        "jobs": {job_status.value: count for job_status, count in jobs.items()},
+        "database": pool_stats()
+    }
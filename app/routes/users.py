@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import get_async_db
 from app.models.models import User, UserRole
+from app import counters
 from app.dependencies import get_current_user
-from app.auth import get_password_hash
+from app.principal_cache import principal_cache
+from app.auth import get_password_hash_async
 
 router = APIRouter()
 
 @router.get("/users")
 async def get_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Only admin can view all users
@@ -19,7 +22,7 @@ async def get_users(
             detail="Chỉ admin mới có quyền xem danh sách người dùng"
         )
     
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return {
         "users": [
             {
@@ -38,7 +41,7 @@ async def get_users(
 async def update_user_role(
     user_id: int,
     role: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Only admin can change user roles
@@ -48,7 +51,7 @@ async def update_user_role(
             detail="Chỉ admin mới có quyền thay đổi quyền người dùng"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,7 +68,8 @@ async def update_user_role(
         )
     
     user.role = new_role
-    db.commit()
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
     
     return {
         "message": "Cập nhật quyền thành công",
@@ -79,7 +83,7 @@ async def update_user_role(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Only admin can delete users
@@ -96,15 +100,17 @@ async def delete_user(
             detail="Không thể xóa chính mình"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Không tìm thấy người dùng"
         )
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.run_sync(counters.user_deleted)
+    await db.commit()
+    principal_cache.invalidate_user(user_id)
     
     return {"message": "Xóa người dùng thành công"}
 
@@ -115,7 +121,7 @@ async def create_user_by_admin(
     full_name: str = Form(...),
     password: str = Form(...),
     role: str = Form("user"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Only admin can create users
@@ -126,9 +132,9 @@ async def create_user_by_admin(
         )
     
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = await db.scalar(select(User).where(
         (User.username == username) | (User.email == email)
-    ).first()
+    ))
     
     if existing_user:
         raise HTTPException(
@@ -145,7 +151,7 @@ async def create_user_by_admin(
             detail="Quyền không hợp lệ"
         )
     
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     new_user = User(
         username=username,
         email=email,
@@ -155,8 +161,8 @@ async def create_user_by_admin(
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.run_sync(counters.user_created)
+    await db.commit()
     
     return {
         "message": "Tạo người dùng thành công",
@@ -0,0 +1,284 @@
+"""
+Chỉ mục tìm kiếm toàn văn (SQLite FTS5) cho học liệu.
+
+Bảng ảo materials_fts có rowid = materials.id và các cột title, subject, topic,
+content (nội dung file lấy từ bảng extracted_texts). Chỉ mục được cập nhật khi
+tạo/sửa/xóa học liệu; kết quả được xếp hạng bằng BM25 và kèm đoạn trích có đánh dấu.
+Với database khác SQLite, tìm kiếm quay về so khớp LIKE (không có xếp hạng, có phân biệt dấu).
+
+Tìm kiếm không phân biệt dấu: văn bản được bỏ dấu một lần khi ghi (app/text_normalize.py)
+rồi mới đưa vào chỉ mục, từ khóa tìm kiếm cũng được bỏ dấu như vậy, nên "triet hoc"
+khớp "Triết học" bằng một lần tra chỉ mục. Văn bản gốc (NFC) nằm ở bảng
+material_search_texts, là bảng nội dung ngoài (external content) của materials_fts:
+snippet() đọc văn bản gốc và đánh dấu theo vị trí từ trong chỉ mục, nên đoạn trích
+vẫn giữ dấu. Khi xóa khỏi chỉ mục phải đưa lại đúng các giá trị đã bỏ dấu, nên bản
+gốc được đọc và bỏ dấu lại trước khi xóa.
+
+Tìm chuỗi con và gõ sai: bảng materials_trigram (tokenizer trigram, cùng bảng nội dung
+ngoài) đánh chỉ mục từng cụm 3 ký tự của tiêu đề, môn học, chủ đề và tên người đăng.
+Bộ lọc uploader là một truy vấn cụm từ trên chỉ mục này (chuỗi con, không cần LIKE '%...%').
+Bộ lọc search lấy thêm các học liệu có chung đủ trigram với từ khóa (đếm trên danh sách
+học liệu của từng trigram), xếp sau các kết quả khớp theo từ. Chỉ lấy trigram nằm trong
+từng từ của từ khóa (trigram vắt qua khoảng trắng khớp lung tung giữa hai từ bất kỳ), và
+học liệu phải chứa ít nhất TRIGRAM_MIN_SIMILARITY số trigram đó, tối thiểu
+TRIGRAM_MIN_HITS trigram. Các kết quả này được tính vào tổng, facet và file xuất nên
+ngưỡng phải chặt: một lỗi gõ trong từ dài (từ 6-7 ký tự trở lên, hoặc từ khóa nhiều từ)
+vẫn tìm được, còn từ ngắn gõ sai và từ dưới 3 ký tự thì không tìm gần đúng.
+Tên người đăng được chép vào chỉ mục khi đánh chỉ mục học liệu; nếu sau này cho phép đổi
+họ tên người dùng thì phải gọi index_material() lại cho các học liệu của người đó.
+"""
+
+from sqlalchemy import text, or_, exists, bindparam, Integer, Float
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from app.models.models import Material, MaterialFile, ExtractedText, User
+from app.text_normalize import fold, normalize
+import html
+import math
+import re
+
+FTS_TABLE = "materials_fts"
+TRIGRAM_TABLE = "materials_trigram"
+SOURCE_TABLE = "material_search_texts"
+COLUMNS = ("title", "subject", "topic", "content")
+TRIGRAM_COLUMNS = ("title", "subject", "topic", "uploader")
+
+# Trọng số BM25 theo thứ tự cột: title, subject, topic, content
+BM25_WEIGHTS = "10.0, 5.0, 5.0, 1.0"
+
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+SNIPPET_TOKENS = 16
+
+# Tỉ lệ trigram của từ khóa mà học liệu phải chứa để được coi là khớp gần đúng
+TRIGRAM_MIN_SIMILARITY = 0.7
+TRIGRAM_MIN_HITS = 2
+TRIGRAM_MAX_TERMS = 32
+
+CREATE_STATEMENTS = {
+    SOURCE_TABLE: f"CREATE TABLE {SOURCE_TABLE} ("
+        "material_id INTEGER PRIMARY KEY, title TEXT, subject TEXT, topic TEXT, uploader TEXT, content TEXT)",
+    FTS_TABLE: f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, subject, topic, content, content = '{SOURCE_TABLE}', "
+        "content_rowid = 'material_id', tokenize = 'unicode61')",
+    TRIGRAM_TABLE: f"CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING fts5("
+        f"title, subject, topic, uploader, content = '{SOURCE_TABLE}', "
+        "content_rowid = 'material_id', tokenize = 'trigram')"
+}
+
+def is_supported(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+def ensure_search_index(db: Session) -> bool:
+    """
+    Tạo các bảng chỉ mục nếu chưa có. Trả về True nếu bảng vừa được tạo (cần rebuild).
+    Chỉ mục của phiên bản cũ (cấu trúc bảng khác CREATE_STATEMENTS) được tạo lại.
+    """
+    if not is_supported(db):
+        return False
+
+    existing = dict(db.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN :names")
+            .bindparams(bindparam("names", expanding=True)),
+        {"names": list(CREATE_STATEMENTS)}
+    ).all())
+    if existing == CREATE_STATEMENTS:
+        return False
+
+    for name in (FTS_TABLE, TRIGRAM_TABLE, SOURCE_TABLE):
+        db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    for statement in CREATE_STATEMENTS.values():
+        db.execute(text(statement))
+    db.commit()
+    return True
+
+def _material_content(db: Session, material: Material) -> str:
+    texts = db.query(ExtractedText.text).join(
+        MaterialFile, MaterialFile.path == ExtractedText.file_path
+    ).filter(MaterialFile.material_id == material.id).order_by(MaterialFile.position).all()
+    return "\n".join(t for (t,) in texts if t)
+
+def _write_folded(db: Session, table: str, columns, material_id: int, values: Dict[str, str], command: str = ""):
+    """Ghi giá trị đã bỏ dấu vào bảng FTS; command="delete" xóa đúng các giá trị đã ghi trước đó."""
+    names = ", ".join(columns)
+    params = ", ".join(f":{column}" for column in columns)
+    if command:
+        statement = f"INSERT INTO {table} ({table}, rowid, {names}) VALUES ('{command}', :id, {params})"
+    else:
+        statement = f"INSERT INTO {table} (rowid, {names}) VALUES (:id, {params})"
+    db.execute(text(statement), {"id": material_id, **{column: fold(values[column]) for column in columns}})
+
+def _remove(db: Session, material_id: int):
+    source = db.execute(
+        text(f"SELECT * FROM {SOURCE_TABLE} WHERE material_id = :id"),
+        {"id": material_id}
+    ).mappings().first()
+    if source is None:
+        return
+
+    _write_folded(db, FTS_TABLE, COLUMNS, material_id, source, command="delete")
+    _write_folded(db, TRIGRAM_TABLE, TRIGRAM_COLUMNS, material_id, source, command="delete")
+    db.execute(text(f"DELETE FROM {SOURCE_TABLE} WHERE material_id = :id"), {"id": material_id})
+
+def index_material(db: Session, material: Material):
+    """Thêm/cập nhật học liệu trong chỉ mục. Không commit."""
+    if not is_supported(db):
+        return
+
+    _remove(db, material.id)
+    uploader = db.query(User.full_name).filter(User.id == material.uploader_id).scalar()
+    values = {
+        "title": normalize(material.title),
+        "subject": normalize(material.subject),
+        "topic": normalize(material.topic or ""),
+        "uploader": normalize(uploader or ""),
+        "content": normalize(_material_content(db, material))
+    }
+    db.execute(
+        text(f"INSERT INTO {SOURCE_TABLE} (material_id, {', '.join(values)}) "
+             f"VALUES (:id, {', '.join(':' + column for column in values)})"),
+        {"id": material.id, **values}
+    )
+    _write_folded(db, FTS_TABLE, COLUMNS, material.id, values)
+    _write_folded(db, TRIGRAM_TABLE, TRIGRAM_COLUMNS, material.id, values)
+
+def remove_material(db: Session, material_id: int):
+    """Xóa học liệu khỏi chỉ mục. Không commit."""
+    if not is_supported(db):
+        return
+    _remove(db, material_id)
+
+def rebuild_search_index(db: Session) -> int:
+    """Xây dựng lại toàn bộ chỉ mục từ bảng materials."""
+    if not is_supported(db):
+        return 0
+
+    ensure_search_index(db)
+    db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')"))
+    db.execute(text(f"INSERT INTO {TRIGRAM_TABLE} ({TRIGRAM_TABLE}) VALUES ('delete-all')"))
+    db.execute(text(f"DELETE FROM {SOURCE_TABLE}"))
+
+    count = 0
+    for material in db.query(Material).yield_per(200):
+        index_material(db, material)
+        count += 1
+
+    db.commit()
+    return count
+
+def build_match_query(search: str, include_content: bool) -> Optional[str]:
+    """
+    Chuyển chuỗi người dùng nhập thành biểu thức FTS5 an toàn:
+    mỗi từ được bỏ dấu, đặt trong dấu nháy và tìm theo tiền tố, các từ nối bằng AND.
+    """
+    tokens = re.findall(r"\w+", fold(search))
+    if not tokens:
+        return None
+
+    expr = " AND ".join(f'"{token}"*' for token in tokens)
+    if include_content:
+        return expr
+    return f"{{title subject topic}} : ({expr})"
+
+def trigram_terms(query: str) -> List[str]:
+    """Các trigram khác nhau nằm trong từng từ của từ khóa (đã bỏ dấu); bỏ qua từ ngắn hơn 3 ký tự."""
+    terms = dict.fromkeys(
+        word[i:i + 3]
+        for word in re.findall(r"\w+", fold(query).lower())
+        for i in range(len(word) - 2)
+    )
+    return list(terms)[:TRIGRAM_MAX_TERMS]
+
+def trigram_min_hits(term_count: int) -> int:
+    """Số trigram chung tối thiểu: TRIGRAM_MIN_SIMILARITY số trigram, ít nhất TRIGRAM_MIN_HITS (nếu đủ)."""
+    return min(term_count, max(TRIGRAM_MIN_HITS, math.ceil(term_count * TRIGRAM_MIN_SIMILARITY)))
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+def search_subquery(match: Optional[str], search: str):
+    """
+    Subquery (material_id, rank) của bộ lọc search; rank càng nhỏ càng liên quan.
+    Khớp theo từ (match) có rank BM25 (âm); khớp gần đúng theo trigram trên tiêu đề,
+    môn học, chủ đề có rank từ 0 đến 1 (càng nhiều trigram chung càng nhỏ) nên luôn
+    đứng sau. None nếu từ khóa không dùng được cho cả hai chỉ mục.
+    """
+    parts = []
+    params = {}
+    if match:
+        parts.append(
+            f"SELECT rowid AS material_id, bm25({FTS_TABLE}, {BM25_WEIGHTS}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        )
+        params["match"] = match
+
+    terms = trigram_terms(search)
+    if terms:
+        # Mỗi trigram là một danh sách học liệu; đếm số danh sách chứa từng học liệu
+        postings = " UNION ALL ".join(
+            f"SELECT rowid AS material_id FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH :trigram_{i}"
+            for i in range(len(terms))
+        )
+        min_hits = trigram_min_hits(len(terms))
+        parts.append(
+            f"SELECT material_id, 1.0 - count(*) * 1.0 / {len(terms)} AS rank FROM ({postings}) "
+            f"GROUP BY material_id HAVING count(*) >= {min_hits}"
+        )
+        params.update({
+            f"trigram_{i}": f"{{title subject topic}} : {_phrase(term)}"
+            for i, term in enumerate(terms)
+        })
+
+    if not parts:
+        return None
+    # bm25() không dùng được khi SQLite làm phẳng subquery một vế vào GROUP BY
+    statement = parts[0] if len(parts) == 1 else (
+        f"SELECT material_id, min(rank) AS rank FROM ({' UNION ALL '.join(parts)}) GROUP BY material_id"
+    )
+    return text(statement).bindparams(**params).columns(material_id=Integer, rank=Float).subquery("fts")
+
+def uploader_subquery(uploader: str):
+    """Subquery (material_id) các học liệu có tên người đăng chứa chuỗi; None nếu ngắn hơn 3 ký tự."""
+    folded = " ".join(fold(uploader).split())
+    if len(folded) < 3:
+        return None
+    return text(
+        f"SELECT rowid AS material_id FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH :uploader_match"
+    ).bindparams(uploader_match=f"{{uploader}} : {_phrase(folded)}").columns(material_id=Integer).subquery("uploader_trigram")
+
+def like_filter(search: str, include_content: bool):
+    """Điều kiện LIKE thay thế cho database không hỗ trợ FTS5."""
+    pattern = f"%{search}%"
+    conditions = [
+        Material.title.ilike(pattern),
+        Material.subject.ilike(pattern),
+        Material.topic.ilike(pattern)
+    ]
+    if include_content:
+        conditions.append(exists().where(
+            MaterialFile.material_id == Material.id,
+            ExtractedText.file_path == MaterialFile.path,
+            ExtractedText.text.ilike(pattern)
+        ))
+    return or_(*conditions)
+
+def get_snippets(db: Session, match: str, material_ids: Iterable[int]) -> Dict[int, str]:
+    """Đoạn trích (HTML an toàn, từ khớp bọc trong <mark>) cho các học liệu đã chọn."""
+    ids = list(material_ids)
+    if not ids or not is_supported(db):
+        return {}
+
+    rows = db.execute(
+        text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :start, :end, '…', {SNIPPET_TOKENS}) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND rowid IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"start": SNIPPET_START, "end": SNIPPET_END, "match": match, "ids": ids}
+    ).all()
+
+    return {
+        material_id: html.escape(snippet)
+            .replace(SNIPPET_START, "<mark>")
+            .replace(SNIPPET_END, "</mark>")
+        for material_id, snippet in rows
+    }
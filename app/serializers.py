@@ -0,0 +1,77 @@
+"""
+Chuyển đổi Material sang JSON dùng chung cho mọi route trả về học liệu.
+
+Các query phải được bọc bằng with_relations() để khoa và người đăng được nạp
+trong cùng câu SQL (joined eager loading) và danh sách file được nạp bằng một câu
+SELECT ... IN duy nhất; nhờ vậy số câu lệnh SQL mỗi request không tăng theo số
+học liệu trả về.
+"""
+
+from sqlalchemy.orm import Query, joinedload, selectinload
+from typing import Iterable
+from app.models.models import Material, MaterialFile, Department
+import json
+
+def with_relations(query: Query, include_files: bool = True) -> Query:
+    options = [joinedload(Material.department), joinedload(Material.uploader)]
+    if include_files:
+        options.append(selectinload(Material.files))
+    return query.options(*options)
+
+def serialize_file(material_file: MaterialFile) -> dict:
+    return {
+        "id": material_file.id,
+        "type": material_file.file_type,
+        "path": material_file.path,
+        "name": material_file.original_name,
+        "size": material_file.size,
+        "mime_type": material_file.mime_type,
+        "download_url": f"/api/download/{material_file.material_id}/{material_file.position}",
+        "download_count": material_file.download_count or 0
+    }
+
+def files_to_json(files: Iterable[MaterialFile]) -> str:
+    """Bản sao JSON (định dạng cũ) cho cột Material.files_json"""
+    return json.dumps([
+        {"type": f.file_type, "path": f.path, "name": f.original_name}
+        for f in files
+    ], ensure_ascii=False)
+
+def serialize_department(department: Department) -> dict:
+    return {
+        "id": department.id,
+        "code": department.code,
+        "name": department.name
+    }
+
+def serialize_material(material: Material, detail: bool = False) -> dict:
+    data = {
+        "id": material.id,
+        "title": material.title,
+        "subject": material.subject,
+        "topic": material.topic,
+        "files": [serialize_file(f) for f in material.files],
+        "department": serialize_department(material.department),
+        "uploader": {
+            "id": material.uploader.id,
+            "full_name": material.uploader.full_name
+        },
+        "created_at": material.created_at.isoformat()
+    }
+
+    if detail:
+        data["uploader"]["email"] = material.uploader.email
+        data["updated_at"] = material.updated_at.isoformat()
+
+    return data
+
+def serialize_recent_upload(material: Material) -> dict:
+    """Dạng rút gọn cho danh sách upload gần đây trên dashboard"""
+    return {
+        'id': material.id,
+        'title': material.title,
+        'subject': material.subject,
+        'uploader': material.uploader.username if material.uploader else 'Unknown',
+        'department': material.department.name if material.department else 'Unknown',
+        'created_at': material.created_at.isoformat()
+    }
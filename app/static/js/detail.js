@@ -70,11 +70,11 @@ function renderFilesList() {
             </div>
             <div class="file-actions">
                 ${canPreview(file.name) ? `
-                    <button class="btn-preview" onclick="previewFile(${index}, '${file.path}', '${file.name}')">
+                    <button class="btn-preview" onclick="previewFile(${index}, '${file.download_url}', '${file.name}')">
                         <i class="fas fa-eye"></i> Xem trước
                     </button>
                 ` : ''}
-                <button class="btn-download" onclick="downloadFile('${file.path}', '${file.name}')">
+                <button class="btn-download" onclick="downloadFile('${file.download_url}', '${file.name}')">
                     <i class="fas fa-download"></i> Tải xuống
                 </button>
             </div>
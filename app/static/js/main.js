@@ -2,7 +2,10 @@
 let currentUser = null;
 let currentDepartmentId = null;
 let materials = [];
-let allMaterials = []; // Keep unfiltered list
+let nextCursor = null;
+let totalMaterials = 0;
+let currentSort = null; // null = server default (relevance when searching, newest first otherwise)
+let currentOrder = null;
 let departments = [];
 let users = [];
 let searchContentEnabled = false;
@@ -42,6 +45,7 @@ function renderDepartments() {
         <div class="department-item active" data-id="all" onclick="selectDepartment(null, event)">
             <span class="department-code">All</span>
             <span class="department-name">Tất cả các khoa</span>
+            <span class="department-count"></span>
         </div>
     ` + departments.map((dept) => `
         <div class="department-item" 
@@ -49,10 +53,23 @@ function renderDepartments() {
              onclick="selectDepartment(${dept.id}, event)">
             <span class="department-code">${dept.code}</span>
             <span class="department-name">${dept.name}</span>
+            <span class="department-count"></span>
         </div>
     `).join('');
 }
 
+// Show per-department counts for the current search and column filters
+function updateDepartmentCounts(counts) {
+    if (!counts) return;
+    
+    const byId = Object.fromEntries(counts.map(f => [String(f.value), f.count]));
+    const all = counts.reduce((sum, f) => sum + f.count, 0);
+    document.querySelectorAll('.department-item').forEach(item => {
+        const count = item.dataset.id === 'all' ? all : (byId[item.dataset.id] || 0);
+        item.querySelector('.department-count').textContent = count;
+    });
+}
+
 // Select department
 function selectDepartment(departmentId, event) {
     currentDepartmentId = departmentId;
@@ -67,53 +84,120 @@ function selectDepartment(departmentId, event) {
     loadMaterials();
 }
 
-// Load materials
-async function loadMaterials() {
+// Build query parameters from the search bar, column filters and sort state
+function buildMaterialParams() {
+    const params = new URLSearchParams();
+    
+    if (currentDepartmentId) {
+        params.append('department_id', currentDepartmentId);
+    }
+    
+    const search = document.getElementById('filterSearch')?.value;
+    if (search) {
+        params.append('search', search);
+    }
+    
+    const uploader = document.getElementById('filterUploader')?.value;
+    if (uploader) {
+        params.append('uploader', uploader);
+    }
+    
+    // Add content search parameter
+    if (searchContentEnabled && search) {
+        params.append('search_content', 'true');
+    }
+    
+    // Column filters are applied on the server
+    if (columnFilters.subject) params.append('subject', columnFilters.subject);
+    if (columnFilters.topic) params.append('topic', columnFilters.topic);
+    if (columnFilters.uploader) params.append('uploader_name', columnFilters.uploader);
+    if (columnFilters.dateFrom) params.append('date_from', columnFilters.dateFrom);
+    if (columnFilters.dateTo) params.append('date_to', columnFilters.dateTo);
+    
+    if (currentSort && !(currentSort === 'relevance' && !search)) {
+        params.append('sort', currentSort);
+        if (currentOrder) params.append('order', currentOrder);
+    }
+    
+    return params;
+}
+
+// Load materials (first page, or the next page when append is true)
+async function loadMaterials(append = false) {
     try {
-        let url = '/api/materials';
-        const params = new URLSearchParams();
-        
-        if (currentDepartmentId) {
-            params.append('department_id', currentDepartmentId);
-        }
-        
-        const search = document.getElementById('filterSearch')?.value;
-        if (search) {
-            params.append('search', search);
+        const params = buildMaterialParams();
+        if (append && nextCursor) {
+            params.append('cursor', nextCursor);
+        } else {
+            params.append('facets', 'subject,topic,uploader,department');
         }
         
-        const uploader = document.getElementById('filterUploader')?.value;
-        if (uploader) {
-            params.append('uploader', uploader);
-        }
+        const response = await fetch('/api/materials?' + params.toString());
+        const data = await response.json();
         
-        // Add content search parameter
-        if (searchContentEnabled && search) {
-            params.append('search_content', 'true');
+        if (!response.ok) {
+            throw new Error(data.detail || 'Không thể tải danh sách học liệu');
         }
         
-        if (params.toString()) {
-            url += '?' + params.toString();
+        if (append) {
+            materials = materials.concat(data.materials);
+        } else {
+            materials = data.materials;
+            totalMaterials = data.total;
+            
+            // Update column filter options
+            updateColumnFilterOptions(data.facets);
+            updateDepartmentCounts(data.facets?.department);
         }
-        
-        const response = await fetch(url);
-        const data = await response.json();
-        allMaterials = data.materials;
-        materials = [...allMaterials];
-        
-        // Update column filter options
-        updateColumnFilterOptions();
-        
-        // Apply column filters
-        applyColumnFilters();
+        nextCursor = data.next_cursor;
         
         renderMaterialsTable();
+        renderLoadMore();
+        renderSortIndicators(data.sort, data.order);
     } catch (error) {
         console.error('Error loading materials:', error);
         showError('Không thể tải danh sách học liệu');
     }
 }
 
+// Load next page
+function loadMoreMaterials() {
+    if (nextCursor) {
+        loadMaterials(true);
+    }
+}
+
+// Render "load more" button and counter
+function renderLoadMore() {
+    const info = document.getElementById('materialsCountInfo');
+    if (info) {
+        info.textContent = `Hiển thị ${materials.length} / ${totalMaterials} học liệu`;
+    }
+    
+    const button = document.getElementById('loadMoreBtn');
+    if (button) {
+        button.style.display = nextCursor ? '' : 'none';
+    }
+}
+
+// Sort by column (click again to reverse order)
+function sortBy(column) {
+    if (currentSort === column) {
+        currentOrder = currentOrder === 'asc' ? 'desc' : 'asc';
+    } else {
+        currentSort = column;
+        currentOrder = column === 'created_at' ? 'desc' : 'asc';
+    }
+    loadMaterials();
+}
+
+// Show sort direction on column headers
+function renderSortIndicators(sort, order) {
+    document.querySelectorAll('.sort-indicator').forEach(el => {
+        el.textContent = el.dataset.sort === sort ? (order === 'asc' ? '▲' : '▼') : '';
+    });
+}
+
 // Render materials table
 function renderMaterialsTable() {
     const tbody = document.getElementById('materialsTableBody');
@@ -138,7 +222,10 @@ function renderMaterialsTable() {
         return `
             <tr onclick="viewMaterialDetail(${material.id})" style="cursor: pointer;">
                 <td class="col-stt">${index + 1}</td>
-                <td class="col-title"><strong>${escapeHtml(material.title)}</strong></td>
+                <td class="col-title">
+                    <strong>${escapeHtml(material.title)}</strong>
+                    ${material.snippet ? `<div class="search-snippet">${material.snippet}</div>` : ''}
+                </td>
                 <td class="col-subject">${escapeHtml(material.subject)}</td>
                 <td class="col-topic">${material.topic ? escapeHtml(material.topic) : '-'}</td>
                 <td class="col-files">
@@ -224,73 +311,27 @@ function toggleColumn(columnClass) {
     });
 }
 
-// Update column filter options
-function updateColumnFilterOptions() {
-    // Get unique values
-    const subjects = [...new Set(allMaterials.map(m => m.subject))].sort();
-    const topics = [...new Set(allMaterials.map(m => m.topic).filter(t => t))].sort();
-    const uploaders = [...new Set(allMaterials.map(m => m.uploader.full_name))].sort();
+// Update column filter options from server facet counts
+function updateColumnFilterOptions(facets) {
+    if (!facets) return;
     
-    // Update subject filter
-    const subjectFilter = document.getElementById('filterSubject');
-    if (subjectFilter) {
-        subjectFilter.innerHTML = '<option value="">-- Tất cả --</option>' +
-            subjects.map(s => `<option value="${escapeHtml(s)}">${escapeHtml(s)}</option>`).join('');
-    }
-    
-    // Update topic filter
-    const topicFilter = document.getElementById('filterTopic');
-    if (topicFilter) {
-        topicFilter.innerHTML = '<option value="">-- Tất cả --</option>' +
-            topics.map(t => `<option value="${escapeHtml(t)}">${escapeHtml(t)}</option>`).join('');
-    }
+    const fill = (elementId, values, selected) => {
+        const select = document.getElementById(elementId);
+        if (!select) return;
+        select.innerHTML = '<option value="">-- Tất cả --</option>' +
+            values.map(f => `<option value="${escapeHtml(f.value)}">${escapeHtml(f.value)} (${f.count})</option>`).join('');
+        select.value = selected;
+    };
     
-    // Update uploader filter
-    const uploaderFilter = document.getElementById('filterUploaderSelect');
-    if (uploaderFilter) {
-        uploaderFilter.innerHTML = '<option value="">-- Tất cả --</option>' +
-            uploaders.map(u => `<option value="${escapeHtml(u)}">${escapeHtml(u)}</option>`).join('');
-    }
+    fill('filterSubject', facets.subject, columnFilters.subject);
+    fill('filterTopic', facets.topic, columnFilters.topic);
+    fill('filterUploaderSelect', facets.uploader, columnFilters.uploader);
 }
 
 // Filter by column
 function filterByColumn(column, value) {
     columnFilters[column] = value;
-    applyColumnFilters();
-    renderMaterialsTable();
-}
-
-// Apply all column filters
-function applyColumnFilters() {
-    materials = allMaterials.filter(m => {
-        // Filter by subject
-        if (columnFilters.subject && m.subject !== columnFilters.subject) return false;
-        
-        // Filter by topic
-        if (columnFilters.topic && m.topic !== columnFilters.topic) return false;
-        
-        // Filter by uploader
-        if (columnFilters.uploader && m.uploader.full_name !== columnFilters.uploader) return false;
-        
-        // Filter by date range
-        if (columnFilters.dateFrom || columnFilters.dateTo) {
-            const materialDate = new Date(m.created_at);
-            
-            if (columnFilters.dateFrom) {
-                const fromDate = new Date(columnFilters.dateFrom);
-                fromDate.setHours(0, 0, 0, 0);
-                if (materialDate < fromDate) return false;
-            }
-            
-            if (columnFilters.dateTo) {
-                const toDate = new Date(columnFilters.dateTo);
-                toDate.setHours(23, 59, 59, 999);
-                if (materialDate > toDate) return false;
-            }
-        }
-        
-        return true;
-    });
+    loadMaterials();
 }
 
 // Filter by date range
@@ -301,8 +342,7 @@ function filterByDateRange() {
     columnFilters.dateFrom = dateFrom;
     columnFilters.dateTo = dateTo;
     
-    applyColumnFilters();
-    renderMaterialsTable();
+    loadMaterials();
 }
 
 // Toggle column filters visibility
@@ -343,9 +383,8 @@ function resetColumnFilters() {
     if (dateFromFilter) dateFromFilter.value = '';
     if (dateToFilter) dateToFilter.value = '';
     
-    // Reapply filters (will show all)
-    applyColumnFilters();
-    renderMaterialsTable();
+    // Reload from the server (will show all)
+    loadMaterials();
 }
 
 // Get badge class for material type
@@ -634,13 +673,15 @@ function setupEventListeners() {
     // Search filter
     const filterSearch = document.getElementById('filterSearch');
     if (filterSearch) {
-        filterSearch.addEventListener('input', debounce(loadMaterials, 500));
+        filterSearch.addEventListener('input', debounce(() => loadSuggestions(filterSearch, 'searchSuggestions'), 150));
+        filterSearch.addEventListener('input', debounce(() => loadMaterials(), 500));
     }
     
     // Uploader filter
     const filterUploader = document.getElementById('filterUploader');
     if (filterUploader) {
-        filterUploader.addEventListener('input', debounce(loadMaterials, 500));
+        filterUploader.addEventListener('input', debounce(() => loadSuggestions(filterUploader, 'uploaderSuggestions', 'uploader'), 150));
+        filterUploader.addEventListener('input', debounce(() => loadMaterials(), 500));
     }
     
     // Close modal on outside click
@@ -653,6 +694,44 @@ function setupEventListeners() {
     });
 }
 
+const SUGGESTION_FIELD_LABELS = {
+    title: 'Tiêu đề',
+    subject: 'Môn học',
+    topic: 'Chủ đề',
+    uploader: 'Người đăng'
+};
+
+// Fill a search box's datalist from the suggestions endpoint (in-memory prefix index)
+async function loadSuggestions(input, datalistId, field = null) {
+    const datalist = document.getElementById(datalistId);
+    const query = input.value.trim();
+    if (!datalist) return;
+    if (query.length < 2) {
+        datalist.innerHTML = '';
+        return;
+    }
+    
+    try {
+        const params = new URLSearchParams({ q: query });
+        if (field) {
+            params.append('field', field);
+        }
+        
+        const response = await fetch('/api/materials/suggestions?' + params.toString());
+        if (!response.ok) return;
+        const data = await response.json();
+        
+        // Ignore responses that arrive after the user kept typing
+        if (input.value.trim() !== query) return;
+        
+        datalist.innerHTML = data.suggestions.map(s =>
+            `<option value="${escapeHtml(s.value)}" label="${SUGGESTION_FIELD_LABELS[s.field] || ''}"></option>`
+        ).join('');
+    } catch (error) {
+        console.error('Error loading suggestions:', error);
+    }
+}
+
 // Upload material
 async function uploadMaterial() {
     const form = document.getElementById('uploadForm');
@@ -43,13 +43,43 @@ function switchView(view) {
     }
 }
 
+// Query string for the selected date range and granularity
+function statsQuery() {
+    const params = new URLSearchParams();
+    const dateFrom = document.getElementById('statsDateFrom')?.value;
+    const dateTo = document.getElementById('statsDateTo')?.value;
+    if (dateFrom) params.append('date_from', dateFrom);
+    if (dateTo) params.append('date_to', dateTo);
+    params.append('granularity', document.getElementById('statsGranularity')?.value || 'month');
+    return params.toString();
+}
+
+// Show the range covered by the time series in the chart titles
+function updateRangeLabels(data) {
+    const format = (isoDate) => isoDate.split('-').reverse().join('/');
+    document.querySelectorAll('.stats-range-label').forEach(label => {
+        label.textContent = `(${format(data.date_from)} - ${format(data.date_to)})`;
+    });
+}
+
+// Reload the visible view after the range or granularity changed
+function reloadStats() {
+    overallData = null;
+    if (currentView === 'overall') {
+        loadOverallStats();
+    } else {
+        loadDepartmentStats();
+    }
+}
+
 // Load overall statistics
 async function loadOverallStats() {
     try {
-        const response = await fetch('/api/statistics/overall');
+        const response = await fetch('/api/statistics/overall?' + statsQuery());
         
         if (!response.ok) {
-            throw new Error('Failed to load overall statistics');
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || 'Failed to load overall statistics');
         }
         
         overallData = await response.json();
@@ -57,6 +87,7 @@ async function loadOverallStats() {
         
         // Update summary
         document.getElementById('overallTotalMaterials').textContent = overallData.total_materials;
+        updateRangeLabels(overallData);
         
         // Render charts
         renderDeptComparisonChart();
@@ -82,10 +113,11 @@ async function loadDepartmentStats() {
     }
     
     try {
-        const response = await fetch(`/api/statistics/department/${deptId}`);
+        const response = await fetch(`/api/statistics/department/${deptId}?` + statsQuery());
         
         if (!response.ok) {
-            throw new Error('Failed to load department statistics');
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || 'Failed to load department statistics');
         }
         
         departmentData = await response.json();
@@ -103,6 +135,7 @@ async function loadDepartmentStats() {
         // Update summary
         document.getElementById('deptName').textContent = departmentData.department_code;
         document.getElementById('deptTotalMaterials').textContent = departmentData.total_materials;
+        updateRangeLabels(departmentData);
         
         // Render charts
         renderDeptFileTypesChart();
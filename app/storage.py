@@ -0,0 +1,319 @@
+"""
+Lưu file upload xuống đĩa mà không chặn event loop.
+
+File được đọc theo từng khối từ UploadFile và ghi bằng aiofiles; nhiều file trong
+cùng một form được ghi đồng thời. Giới hạn dung lượng mỗi file và tổng mỗi request
+được kiểm tra ngay trong lúc ghi, file dở dang bị xóa khi có lỗi.
+
+Kho lưu theo nội dung: file được băm SHA-256 trong lúc ghi rồi đặt tại
+uploads/<2 ký tự đầu>/<hash><đuôi file>, nên cùng một nội dung chỉ lưu một lần.
+Bảng file_blobs đếm số MaterialFile tham chiếu; file chỉ bị xóa khỏi đĩa khi
+tham chiếu cuối cùng được giải phóng. Mỗi nội dung chỉ có một đường dẫn (file_blobs.path):
+upload sau có cùng nội dung nhưng khác đuôi file dùng lại đường dẫn đó.
+
+File chỉ bị xóa khỏi đĩa sau khi kiểm tra lại, trong một transaction ghi, rằng không
+còn bản ghi nào trỏ tới (remove_unreferenced): request khác đang upload cùng nội dung
+có thể đã dùng file đó.
+"""
+
+from fastapi import UploadFile
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import BinaryIO, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.database.database import SessionLocal
+from app.models.models import FileBlob, MaterialFile
+import aiofiles
+import asyncio
+import hashlib
+import os
+import uuid
+
+load_dotenv()
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "app/static/uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_UPLOAD_FILE_MB = int(os.getenv("MAX_UPLOAD_FILE_MB", "500"))
+MAX_UPLOAD_REQUEST_MB = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "2048"))
+
+INCOMING_DIR = os.path.join(UPLOAD_DIR, ".incoming")
+
+# Đường dẫn lưu trong database (material_files.path, file_blobs.path) luôn có dạng này,
+# tính theo UPLOAD_DIR chứ không theo vị trí thư mục trên đĩa
+PUBLIC_UPLOAD_PREFIX = "/static/uploads/"
+
+os.makedirs(INCOMING_DIR, exist_ok=True)
+
+class UploadTooLarge(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+class UploadLost(Exception):
+    """Nội dung vừa lưu đã bị request khác xóa trước khi được ghi nhận (cần upload lại)."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+class SavedUpload:
+    """
+    Kết quả ghi một file: đường dẫn trên đĩa, đường dẫn public, kích thước và SHA-256.
+    created = True nếu nội dung này vừa được ghi mới vào kho (chưa có từ trước).
+    replaced_path: bản vừa ghi bị thay bằng đường dẫn có sẵn của cùng nội dung
+    (acquire_blob), chờ xóa sau khi transaction kết thúc.
+    """
+
+    def __init__(self, file_type: str, original_name: str, disk_path: str, size: int,
+                 content_hash: str, created: bool = True):
+        self.file_type = file_type
+        self.original_name = original_name
+        self.disk_path = disk_path
+        self.public_path = to_public_path(disk_path)
+        self.size = size
+        self.content_hash = content_hash
+        self.created = created
+        self.replaced_path: Optional[str] = None
+
+class UploadBudget:
+    """Tổng dung lượng còn được phép ghi trong một request (dùng chung giữa các file)"""
+
+    def __init__(self, max_bytes: int):
+        self.remaining = max_bytes
+
+    def consume(self, size: int):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise UploadTooLarge(f"Tổng dung lượng upload vượt quá {MAX_UPLOAD_REQUEST_MB} MB")
+
+def to_disk_path(public_path: str) -> str:
+    """/static/uploads/ab/x.pdf -> <UPLOAD_DIR>/ab/x.pdf"""
+    if public_path.startswith(PUBLIC_UPLOAD_PREFIX):
+        return os.path.join(UPLOAD_DIR, *public_path[len(PUBLIC_UPLOAD_PREFIX):].split('/'))
+    return public_path.replace('/static/', 'app/static/', 1)
+
+def to_public_path(disk_path: str) -> str:
+    """<UPLOAD_DIR>/ab/x.pdf -> /static/uploads/ab/x.pdf (không phụ thuộc thư mục làm việc)"""
+    return PUBLIC_UPLOAD_PREFIX + os.path.relpath(disk_path, UPLOAD_DIR).replace(os.sep, '/')
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def blob_disk_path(content_hash: str, filename: str) -> str:
+    ext = os.path.splitext(os.path.basename(filename))[1].lower()
+    return os.path.join(UPLOAD_DIR, content_hash[:2], f"{content_hash}{ext}")
+
+def _move_into_store(temp_path: str, content_hash: str, filename: str) -> Tuple[str, bool]:
+    """Đưa file tạm vào kho; nếu nội dung đã có thì bỏ file tạm và dùng bản có sẵn."""
+    final_path = blob_disk_path(content_hash, filename)
+    if os.path.exists(final_path):
+        _remove_quietly(temp_path)
+        return final_path, False
+
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(temp_path, final_path)
+    return final_path, True
+
+async def save_upload(
+    upload: UploadFile,
+    file_type: str,
+    budget: UploadBudget,
+    max_file_bytes: Optional[int] = None
+) -> SavedUpload:
+    """Ghi một UploadFile xuống đĩa theo từng khối, đồng thời tính SHA-256."""
+    if max_file_bytes is None:
+        max_file_bytes = MAX_UPLOAD_FILE_MB * 1024 * 1024
+    if upload.size is not None and upload.size > max_file_bytes:
+        raise UploadTooLarge(f"File {upload.filename} vượt quá {MAX_UPLOAD_FILE_MB} MB")
+
+    temp_path = os.path.join(INCOMING_DIR, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_file_bytes:
+                    raise UploadTooLarge(f"File {upload.filename} vượt quá {MAX_UPLOAD_FILE_MB} MB")
+                budget.consume(len(chunk))
+
+                # hashlib nhả GIL với khối lớn nên băm trong threadpool không chặn loop
+                await run_in_threadpool(digest.update, chunk)
+                await out.write(chunk)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    disk_path, created = _move_into_store(temp_path, content_hash, upload.filename)
+    return SavedUpload(file_type, upload.filename, disk_path, size, content_hash, created)
+
+async def save_uploads(
+    uploads: List[Tuple[str, UploadFile]],
+    max_request_bytes: Optional[int] = None
+) -> List[SavedUpload]:
+    """
+    Ghi đồng thời nhiều file (file_type, UploadFile) của một request.
+    Nếu một file lỗi, các file mới ghi của request bị xóa rồi ném lại lỗi đầu tiên.
+    """
+    if max_request_bytes is None:
+        max_request_bytes = MAX_UPLOAD_REQUEST_MB * 1024 * 1024
+    budget = UploadBudget(max_request_bytes)
+
+    results = await asyncio.gather(
+        *(save_upload(upload, file_type, budget) for file_type, upload in uploads),
+        return_exceptions=True
+    )
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await run_in_threadpool(discard_new_uploads, [r for r in results if isinstance(r, SavedUpload)])
+        raise errors[0]
+
+    return results
+
+def store_file(
+    source: BinaryIO,
+    file_type: str,
+    original_name: str,
+    max_file_bytes: Optional[int] = None
+) -> SavedUpload:
+    """
+    Bản đồng bộ của save_upload cho file đọc từ nguồn khác (vd. một file trong ZIP khi
+    nhập hàng loạt): đọc theo khối, băm SHA-256 và đưa vào kho. Gọi từ threadpool.
+    """
+    if max_file_bytes is None:
+        max_file_bytes = MAX_UPLOAD_FILE_MB * 1024 * 1024
+
+    temp_path = os.path.join(INCOMING_DIR, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(temp_path, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_file_bytes:
+                    raise UploadTooLarge(f"File {original_name} vượt quá {MAX_UPLOAD_FILE_MB} MB")
+
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    disk_path, created = _move_into_store(temp_path, content_hash, original_name)
+    return SavedUpload(file_type, original_name, disk_path, size, content_hash, created)
+
+def remove_unreferenced(disk_paths: List[str]):
+    """
+    Xóa các file không còn bản ghi file_blobs / material_files nào trỏ tới. Gọi sau khi
+    transaction của request đã commit hoặc rollback, chạy đồng bộ (threadpool/CLI).
+
+    Kiểm tra và xóa nằm trong một transaction ghi: request đang ghi tham chiếu tới cùng
+    đường dẫn giữ khóa ghi nên phải commit xong trước (SQLite khóa ghi toàn bộ database),
+    request bắt đầu sau thì thấy file đã mất trong acquire_blob.
+    """
+    disk_paths = list(dict.fromkeys(disk_paths))
+    if not disk_paths:
+        return
+
+    public_paths = [to_public_path(path) for path in disk_paths]
+    db = SessionLocal()
+    try:
+        # Lệnh ghi (không đổi dữ liệu) để giữ khóa ghi trong lúc kiểm tra và xóa
+        db.execute(
+            update(FileBlob).where(FileBlob.path.in_(public_paths)).values(ref_count=FileBlob.ref_count)
+        )
+        referenced = {path for (path,) in db.query(FileBlob.path).filter(FileBlob.path.in_(public_paths))}
+        referenced |= {path for (path,) in db.query(MaterialFile.path).filter(MaterialFile.path.in_(public_paths))}
+        for disk_path, public_path in zip(disk_paths, public_paths):
+            if public_path not in referenced:
+                _remove_quietly(disk_path)
+        db.commit()
+    finally:
+        db.close()
+
+def discard_new_uploads(saved_files: List[SavedUpload]):
+    """Xóa các nội dung vừa được ghi mới khi request thất bại (nếu chưa có ai dùng)."""
+    remove_unreferenced(
+        [saved.disk_path for saved in saved_files if saved.created]
+        + [saved.replaced_path for saved in saved_files if saved.replaced_path]
+    )
+
+def discard_replaced_uploads(saved_files: List[SavedUpload]):
+    """Xóa các bản trùng nội dung mà acquire_blob đã thay bằng đường dẫn có sẵn (sau khi commit)."""
+    remove_unreferenced([saved.replaced_path for saved in saved_files if saved.replaced_path])
+
+def acquire_blob(db: Session, saved: SavedUpload) -> FileBlob:
+    """
+    Tăng số tham chiếu tới nội dung đã lưu (tạo bản ghi nếu chưa có). Không commit.
+    Nếu nội dung đã có với đường dẫn khác (khác đuôi file), saved được trỏ về đường dẫn
+    đó; bản vừa ghi chỉ bị xóa sau khi transaction kết thúc (saved.replaced_path, xóa
+    bằng discard_replaced_uploads / discard_new_uploads) vì transaction có thể rollback.
+    """
+    blob = db.query(FileBlob).filter(FileBlob.content_hash == saved.content_hash).first()
+    if blob is None:
+        blob = FileBlob(
+            content_hash=saved.content_hash,
+            path=saved.public_path,
+            size=saved.size,
+            ref_count=0
+        )
+        db.add(blob)
+    elif blob.path != saved.public_path:
+        if saved.created:
+            saved.replaced_path = saved.disk_path
+        saved.public_path = blob.path
+        saved.disk_path = to_disk_path(blob.path)
+        saved.created = False
+    blob.ref_count += 1
+    db.flush()
+
+    # Khóa ghi đang được giữ: file không thể bị remove_unreferenced xóa sau lần kiểm tra này
+    if not os.path.exists(saved.disk_path):
+        raise UploadLost(f"File {saved.original_name} chưa được lưu, vui lòng upload lại")
+    return blob
+
+def release_file(db: Session, material_file: MaterialFile) -> List[str]:
+    """
+    Giải phóng tham chiếu của một MaterialFile. Không commit.
+    Trả về các đường dẫn trên đĩa có thể xóa sau khi commit (xóa bằng remove_unreferenced).
+    File cũ (lưu trước khi có kho theo nội dung) không có bản ghi file_blobs:
+    chỉ xóa khi không còn MaterialFile nào khác dùng cùng đường dẫn.
+    """
+    blob = None
+    if material_file.content_hash:
+        blob = db.query(FileBlob).filter(FileBlob.content_hash == material_file.content_hash).first()
+
+    paths = []
+    if blob is not None:
+        # Mỗi tham chiếu giảm đúng một lần, kể cả MaterialFile cũ trỏ tới bản sao khác đuôi file
+        blob.ref_count -= 1
+        if blob.ref_count <= 0:
+            db.delete(blob)
+            paths.append(to_disk_path(blob.path))
+        if blob.path == material_file.path:
+            return paths
+
+    others = db.query(MaterialFile.id).filter(
+        MaterialFile.path == material_file.path,
+        MaterialFile.id != material_file.id
+    ).first()
+    if not others:
+        paths.append(to_disk_path(material_file.path))
+    return paths
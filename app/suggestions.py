@@ -0,0 +1,267 @@
+"""
+Gợi ý khi gõ ô tìm kiếm (autocomplete): tiêu đề, môn học, chủ đề và tên người đăng.
+
+Mỗi trường giữ trong bộ nhớ một mảng đã sắp xếp các khóa: với mỗi giá trị, một khóa cho
+mỗi vị trí bắt đầu từ (phần còn lại của giá trị, đã bỏ dấu và viết thường), nên gõ
+"triet h" gợi ý được "Giáo trình Triết học". Các khóa khớp tiền tố nằm liền nhau trong
+mảng và được tìm bằng bisect. Kết quả ưu tiên giá trị bắt đầu bằng tiền tố, rồi giá trị
+có nhiều học liệu; mỗi trường chỉ xét tối đa SUGGESTION_SCAN_LIMIT khóa đầu tiên nên
+thời gian trả lời không phụ thuộc kích thước danh mục.
+
+Chỉ mục được nạp lúc khởi động và cập nhật từng phần khi một session commit thay đổi
+học liệu hoặc người dùng (sự kiện after_flush/after_commit như app/reference_data.py).
+Thay đổi từ tiến trình khác (manage.py import-materials, sửa trực tiếp database) được
+cập nhật khi nạp lại toàn bộ, tối đa sau SUGGESTION_REFRESH_SECONDS giây. Việc nạp lại
+chạy nền trong threadpool với session riêng; trong lúc đó các request vẫn được trả lời
+từ chỉ mục cũ (chỉ lần nạp đầu tiên, nếu lúc khởi động chưa nạp, mới chờ).
+
+    SUGGESTION_REFRESH_SECONDS=300
+"""
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.database.database import SessionLocal
+from app.models.models import Material, User
+from app.text_normalize import fold
+import asyncio
+import os
+import threading
+import time
+
+load_dotenv()
+
+SUGGESTION_REFRESH_SECONDS = float(os.getenv("SUGGESTION_REFRESH_SECONDS", "300"))
+SUGGESTION_SCAN_LIMIT = 200
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+FIELDS = ("title", "subject", "topic", "uploader")
+MATERIAL_FIELDS = ("title", "subject", "topic")
+
+def _search_key(value: str) -> str:
+    return " ".join(fold(value).lower().split())
+
+class _ValueIndex:
+    """Số học liệu theo từng giá trị của một trường, kèm mảng khóa (hậu tố, vị trí từ, giá trị)."""
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts = {value: count for value, count in (counts or {}).items() if value and count > 0}
+        self.keys = sorted(entry for value in self.counts for entry in self._entries(value))
+
+    @staticmethod
+    def _entries(value: str) -> List[Tuple[str, int, str]]:
+        words = _search_key(value).split(" ")
+        return [(" ".join(words[position:]), position, value) for position in range(len(words))]
+
+    def add(self, value: Optional[str], delta: int):
+        if not value or not delta:
+            return
+
+        count = self.counts.get(value, 0) + delta
+        if count > 0:
+            if value not in self.counts:
+                for entry in self._entries(value):
+                    insort(self.keys, entry)
+            self.counts[value] = count
+        elif value in self.counts:
+            del self.counts[value]
+            for entry in self._entries(value):
+                index = bisect_left(self.keys, entry)
+                if index < len(self.keys) and self.keys[index] == entry:
+                    del self.keys[index]
+
+    def matches(self, prefix: str) -> Dict[str, int]:
+        """Giá trị -> vị trí từ khớp sớm nhất, trong SUGGESTION_SCAN_LIMIT khóa đầu tiên."""
+        found = {}
+        start = bisect_left(self.keys, (prefix,))
+        for index in range(start, min(start + SUGGESTION_SCAN_LIMIT, len(self.keys))):
+            key, position, value = self.keys[index]
+            if not key.startswith(prefix):
+                break
+            if position < found.get(value, position + 1):
+                found[value] = position
+        return found
+
+class SuggestionIndex:
+    def __init__(self, refresh_seconds: float = SUGGESTION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.fields = {field: _ValueIndex() for field in FIELDS}
+        self.user_names: Dict[int, str] = {}
+        self.uploads: Dict[int, int] = {}  # id người dùng -> số học liệu đã đăng
+        self.loaded_at: Optional[float] = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and self.loaded_at + self.refresh_seconds >= time.monotonic()
+
+    def load(self, db: Session):
+        """Nạp lại toàn bộ từ database (session đồng bộ, hoặc qua AsyncSession.run_sync)."""
+        version = self._version
+        fields = {}
+        for field in MATERIAL_FIELDS:
+            column = getattr(Material, field)
+            fields[field] = _ValueIndex(dict(db.query(column, func.count(Material.id)).group_by(column).all()))
+
+        user_names = dict(db.query(User.id, User.full_name).all())
+        uploads = dict(db.query(Material.uploader_id, func.count(Material.id)).group_by(Material.uploader_id).all())
+        uploader_counts = {}
+        for user_id, count in uploads.items():
+            name = user_names.get(user_id)
+            if name:
+                uploader_counts[name] = uploader_counts.get(name, 0) + count
+        fields["uploader"] = _ValueIndex(uploader_counts)
+
+        with self._lock:
+            # Không ghi đè nếu có thay đổi được áp dụng trong lúc đang nạp
+            if self._version == version:
+                self.fields = fields
+                self.user_names = user_names
+                self.uploads = uploads
+                self.loaded_at = time.monotonic()
+
+    def reload(self):
+        """Nạp lại toàn bộ bằng session riêng (chạy trong threadpool)."""
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    async def _refresh(self):
+        try:
+            await run_in_threadpool(self.reload)
+        except Exception as e:
+            # Giữ chỉ mục cũ; request sau sẽ thử nạp lại
+            print(f"[SUGGESTIONS] Không nạp lại được chỉ mục gợi ý: {type(e).__name__}: {e}")
+        finally:
+            self._refresh_task = None
+
+    def apply(self, changes: Iterable[tuple]):
+        """Áp dụng các thay đổi đã commit (ghi lại bởi _track_changes)."""
+        with self._lock:
+            if self.loaded_at is None:
+                return
+            self._version += 1
+            for change in changes:
+                if change[0] == "user":
+                    _, user_id, old_name, new_name = change
+                    uploads = self.uploads.get(user_id, 0)
+                    self.fields["uploader"].add(old_name, -uploads)
+                    self.fields["uploader"].add(new_name, uploads)
+                    if new_name is None:
+                        self.user_names.pop(user_id, None)
+                    else:
+                        self.user_names[user_id] = new_name
+                elif change[0] == "uploader_id":
+                    _, user_id, delta = change
+                    self.uploads[user_id] = self.uploads.get(user_id, 0) + delta
+                    self.fields["uploader"].add(self.user_names.get(user_id), delta)
+                else:
+                    field, value, delta = change
+                    self.fields[field].add(value, delta)
+
+    def invalidate(self):
+        """Bắt nạp lại toàn bộ ở lần đọc sau (khi không xác định được thay đổi)."""
+        with self._lock:
+            self._version += 1
+            if self.loaded_at is not None:
+                self.loaded_at = float("-inf")
+
+    def lookup(self, query: str, fields: Iterable[str] = FIELDS, limit: int = DEFAULT_SUGGESTIONS) -> List[dict]:
+        prefix = _search_key(query)
+        if not prefix:
+            return []
+
+        candidates = []
+        with self._lock:
+            for field in fields:
+                index = self.fields[field]
+                for value, position in index.matches(prefix).items():
+                    candidates.append((position > 0, -index.counts[value], value, field))
+
+        candidates.sort()
+        return [
+            {"value": value, "field": field, "count": -count}
+            for _, count, value, field in candidates[:limit]
+        ]
+
+    async def suggest(
+        self, db: AsyncSession, query: str, fields: Iterable[str] = FIELDS, limit: int = DEFAULT_SUGGESTIONS
+    ) -> List[dict]:
+        if self.loaded_at is None:
+            await db.run_sync(self.load)
+        elif not self._fresh() and self._refresh_task is None:
+            # Hết hạn: nạp lại nền, request này vẫn trả lời từ chỉ mục hiện có
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+        return self.lookup(query, fields, limit)
+
+suggestion_index = SuggestionIndex()
+
+def _loaded_value(obj, attribute: str):
+    """Giá trị đang có trong đối tượng mà không nạp lại từ database (None nếu chưa nạp)."""
+    return inspect(obj).dict.get(attribute)
+
+def _old_and_new(obj, attribute: str):
+    history = inspect(obj).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+def _material_changes(obj: Material, delta: int) -> List[tuple]:
+    changes = [(field, _loaded_value(obj, field), delta) for field in MATERIAL_FIELDS]
+    changes.append(("uploader_id", _loaded_value(obj, "uploader_id"), delta))
+    return changes
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session: Session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Material):
+            changes += _material_changes(obj, 1)
+        elif isinstance(obj, User):
+            changes.append(("user", obj.id, None, obj.full_name))
+
+    for obj in session.dirty:
+        if isinstance(obj, Material):
+            for field in (*MATERIAL_FIELDS, "uploader_id"):
+                old_and_new = _old_and_new(obj, field)
+                if old_and_new is not None:
+                    old, new = old_and_new
+                    changes += [(field, old, -1), (field, new, 1)]
+        elif isinstance(obj, User):
+            old_and_new = _old_and_new(obj, "full_name")
+            if old_and_new is not None:
+                changes.append(("user", obj.id, *old_and_new))
+
+    for obj in session.deleted:
+        if isinstance(obj, Material):
+            if any(key not in inspect(obj).dict for key in (*MATERIAL_FIELDS, "uploader_id")):
+                session.info["suggestions_stale"] = True
+            changes += _material_changes(obj, -1)
+        elif isinstance(obj, User):
+            changes.append(("user", obj.id, _loaded_value(obj, "full_name"), None))
+
+    if changes:
+        session.info.setdefault("suggestion_changes", []).extend(changes)
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session):
+    changes = session.info.pop("suggestion_changes", None)
+    if session.info.pop("suggestions_stale", False):
+        suggestion_index.invalidate()
+    elif changes:
+        suggestion_index.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes_after_rollback(session: Session):
+    session.info.pop("suggestion_changes", None)
+    session.info.pop("suggestions_stale", None)
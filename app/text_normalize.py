@@ -0,0 +1,41 @@
+"""
+Chuẩn hóa văn bản tiếng Việt cho tìm kiếm không phân biệt dấu.
+
+fold() đưa văn bản về NFC rồi bỏ dấu từng chữ cái Latin ("Triết học" -> "Triet hoc",
+"Đảng" -> "Dang"); chữ hoa/thường được giữ nguyên (FTS5 tự bỏ phân biệt hoa/thường).
+Văn bản NFD (thường gặp khi trích xuất từ PDF hoặc tên file trên macOS) cho cùng kết quả.
+
+Mỗi chữ cái sau NFC được thay bằng đúng một chữ cái nên ranh giới từ không đổi:
+chỉ mục FTS5 xây từ văn bản đã bỏ dấu vẫn dùng được để đánh dấu đoạn trích
+trên văn bản gốc (xem app/search_index.py).
+"""
+
+import unicodedata
+
+def _build_fold_table() -> dict:
+    table = {}
+    # Latin-1, Latin Extended-A/B và Latin Extended Additional (ế, ộ, ữ, ... nằm ở đây)
+    for code_point in list(range(0x00C0, 0x0250)) + list(range(0x1E00, 0x1F00)):
+        decomposed = unicodedata.normalize("NFD", chr(code_point))
+        if (len(decomposed) > 1 and decomposed[0].isascii()
+                and all(unicodedata.combining(mark) for mark in decomposed[1:])):
+            table[code_point] = decomposed[0]
+
+    # Đ/đ không phải chữ có dấu theo Unicode nên không tách được bằng NFD;
+    # Ð (U+00D0) hay bị dùng thay Đ trong văn bản cũ
+    table.update({0x0110: "D", 0x0111: "d", 0x00D0: "D"})
+
+    # Dấu rời còn sót lại sau NFC
+    for code_point in range(0x0300, 0x0370):
+        table[code_point] = None
+    return table
+
+_FOLD_TABLE = _build_fold_table()
+
+def normalize(text: str) -> str:
+    """Đưa văn bản về dạng NFC."""
+    return unicodedata.normalize("NFC", text)
+
+def fold(text: str) -> str:
+    """Bỏ dấu tiếng Việt (và các chữ Latin có dấu khác), đ -> d."""
+    return normalize(text).translate(_FOLD_TABLE)
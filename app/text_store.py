@@ -0,0 +1,170 @@
+"""
+Kho lưu nội dung text đã trích xuất từ file học liệu.
+
+Mỗi file chỉ được đọc bằng PyPDF2/python-docx/python-pptx một lần; kết quả được
+lưu vào bảng extracted_texts theo đường dẫn file và mã băm nội dung. Tìm kiếm
+theo nội dung chỉ đọc từ bảng này, file chỉ được trích xuất lại khi đã thay đổi.
+Khi upload, việc trích xuất được giao cho hàng đợi công việc (app/jobs.py).
+"""
+
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional, Tuple
+from app.models.models import ExtractedText
+from app.storage import UPLOAD_DIR, to_disk_path, to_public_path
+from docx import Document
+from pptx import Presentation
+from PyPDF2 import PdfReader
+from datetime import datetime
+import hashlib
+import os
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.pptx'}
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extract_text_from_file(file_path: str, raise_errors: bool = False) -> str:
+    """
+    Extract text content from PDF, DOCX, or PPTX files.
+    raise_errors=True lets background jobs see the failure and retry.
+    """
+    try:
+        ext = os.path.splitext(file_path)[1].lower()
+
+        if ext == '.pdf':
+            reader = PdfReader(file_path)
+            text = ""
+            for page in reader.pages:
+                text += page.extract_text() + "\n"
+            return text
+
+        elif ext == '.docx':
+            doc = Document(file_path)
+            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            return text
+
+        elif ext == '.pptx':
+            prs = Presentation(file_path)
+            text = ""
+            for slide in prs.slides:
+                for shape in slide.shapes:
+                    if hasattr(shape, "text"):
+                        text += shape.text + "\n"
+            return text
+
+        return ""
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error extracting text from {file_path}: {e}")
+        return ""
+
+def plan_extraction(
+    db: Session, public_path: str, content_hash: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Kiểm tra bảng extracted_texts cho file. Trả về None nếu nội dung đã có sẵn
+    (kể cả khi dùng lại text của file khác cùng mã băm), ngược lại trả về
+    (đường dẫn trên đĩa cần trích xuất, mã băm) để gọi extract_text_from_file.
+    content_hash: mã băm đã tính sẵn (khi vừa ghi file) để khỏi đọc lại file.
+    Không commit - người gọi tự commit.
+    """
+    disk_path = to_disk_path(public_path)
+    if os.path.splitext(disk_path)[1].lower() not in SUPPORTED_EXTENSIONS:
+        return None
+    if not os.path.exists(disk_path):
+        return None
+
+    stat = os.stat(disk_path)
+    entry = db.query(ExtractedText).filter(ExtractedText.file_path == public_path).first()
+
+    if entry and entry.file_size == stat.st_size and entry.file_mtime == stat.st_mtime:
+        return None
+
+    if content_hash is None:
+        content_hash = file_sha256(disk_path)
+
+    if entry and entry.content_hash == content_hash:
+        # Chỉ metadata thay đổi (copy/restore file), nội dung giữ nguyên
+        entry.file_size = stat.st_size
+        entry.file_mtime = stat.st_mtime
+        return None
+
+    # Cùng nội dung đã được trích xuất ở đường dẫn khác thì dùng lại (mã băm làm khóa cache)
+    same_content = db.query(ExtractedText.text).filter(
+        ExtractedText.content_hash == content_hash
+    ).first()
+    if same_content:
+        save_extracted_text(db, public_path, content_hash, same_content[0])
+        return None
+
+    return disk_path, content_hash
+
+def save_extracted_text(db: Session, public_path: str, content_hash: str, text: str) -> ExtractedText:
+    """Ghi (hoặc cập nhật) nội dung đã trích xuất của file. Không commit."""
+    stat = os.stat(to_disk_path(public_path))
+    entry = db.query(ExtractedText).filter(ExtractedText.file_path == public_path).first()
+
+    if entry is None:
+        entry = ExtractedText(file_path=public_path)
+        db.add(entry)
+
+    entry.content_hash = content_hash
+    entry.file_size = stat.st_size
+    entry.file_mtime = stat.st_mtime
+    entry.text = text
+    entry.extracted_at = datetime.utcnow()
+    return entry
+
+def refresh_extracted_text(db: Session, public_path: str, content_hash: Optional[str] = None) -> bool:
+    """
+    Đảm bảo bảng extracted_texts có nội dung mới nhất của file, trích xuất ngay
+    trong tiến trình hiện tại (dùng cho lệnh backfill). Trả về True nếu có thay đổi.
+    Không commit.
+    """
+    plan = plan_extraction(db, public_path, content_hash)
+    if plan is None:
+        return bool(db.new or db.dirty)
+
+    disk_path, content_hash = plan
+    save_extracted_text(db, public_path, content_hash, extract_text_from_file(disk_path))
+    return True
+
+def delete_extracted_texts(db: Session, public_paths: Iterable[str]):
+    """Xóa nội dung đã trích xuất của các file (khi xóa học liệu). Không commit."""
+    paths = list(public_paths)
+    if paths:
+        db.query(ExtractedText).filter(
+            ExtractedText.file_path.in_(paths)
+        ).delete(synchronize_session=False)
+
+def backfill_upload_dir(db: Session, upload_dir: str = UPLOAD_DIR) -> dict:
+    """
+    Trích xuất nội dung cho toàn bộ file trong thư mục upload (bỏ qua file không đổi)
+    và xóa các bản ghi của file không còn tồn tại.
+    """
+    result = {"scanned": 0, "updated": 0, "removed": 0}
+
+    for root, dirs, filenames in os.walk(upload_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]  # Bỏ qua thư mục file tạm
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+
+            result["scanned"] += 1
+            if refresh_extracted_text(db, to_public_path(os.path.join(root, filename))):
+                result["updated"] += 1
+            db.commit()
+
+    for entry in db.query(ExtractedText).all():
+        if not os.path.exists(to_disk_path(entry.file_path)):
+            db.delete(entry)
+            result["removed"] += 1
+    db.commit()
+
+    return result
@@ -0,0 +1,121 @@
+"""
+Đo thời gian mã hóa JSON và kích thước payload của danh sách học liệu.
+
+Dựng một danh mục giả (mặc định 10.000 học liệu, mỗi học liệu 1-4 file) bằng đúng
+serializer của API rồi so sánh:
+    - trước: đường mặc định của FastAPI (jsonable_encoder + JSONResponse/json.dumps)
+    - sau:   ORJSONResponse (json_with_etag trả thẳng payload, không qua jsonable_encoder)
+và kích thước body khi không nén / gzip / brotli (app/compression.py).
+
+Không cần database. Cách dùng:
+    python bench_serialization.py
+    python bench_serialization.py --materials 50000 --repeat 7
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.models.models import Material, MaterialFile, Department, User
+from app.serializers import serialize_material
+from app import compression
+
+FILE_TYPES = ("Tài liệu", "Bài giảng", "Đề cương", "Trình chiếu")
+EXTENSIONS = (("pdf", "application/pdf"), ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+              ("pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation"))
+
+def build_catalog(count: int) -> dict:
+    """Payload giống trang đầu của GET /api/materials với count học liệu."""
+    departments = [Department(id=i, code=f"K{i}", name=f"Khoa số {i} - Lý luận chính trị") for i in range(1, 15)]
+    uploaders = [User(id=i, username=f"gv{i}", full_name=f"Giảng viên Nguyễn Văn {i}", email=f"gv{i}@sqct.edu.vn")
+                 for i in range(1, 201)]
+    start = datetime(2024, 1, 1, 7, 30)
+
+    materials = []
+    for i in range(1, count + 1):
+        created_at = start + timedelta(minutes=17 * i)
+        material = Material(
+            id=i,
+            title=f"Bài giảng chuyên đề {i}: Chủ nghĩa duy vật biện chứng và phương pháp luận",
+            subject=f"Môn học {i % 40}",
+            topic=f"Chủ đề {i % 120}" if i % 3 else None,
+            department=departments[i % len(departments)],
+            uploader=uploaders[i % len(uploaders)],
+            created_at=created_at,
+            updated_at=created_at
+        )
+        for position in range(1 + i % 4):
+            extension, mime_type = EXTENSIONS[(i + position) % len(EXTENSIONS)]
+            material.files.append(MaterialFile(
+                id=i * 4 + position,
+                material_id=i,
+                position=position,
+                file_type=FILE_TYPES[position],
+                path=f"/static/uploads/{i % 256:02x}/{i:064x}.{extension}",
+                original_name=f"Tài liệu học tập số {i}-{position}.{extension}",
+                size=100_000 + (i * 7919) % 5_000_000,
+                mime_type=mime_type,
+                download_count=i % 97
+            ))
+        materials.append(material)
+
+    return {
+        "materials": [serialize_material(m) for m in materials],
+        "next_cursor": None,
+        "limit": count,
+        "sort": "created_at",
+        "order": "desc",
+        "total": count
+    }
+
+def measure(fn, repeat: int):
+    """(trung vị, nhỏ nhất) thời gian chạy tính bằng ms, và kết quả lần chạy cuối."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mã hóa JSON và nén payload danh sách học liệu")
+    parser.add_argument("--materials", type=int, default=10000, help="Số học liệu trong danh mục giả")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần đo mỗi phương án")
+    args = parser.parse_args()
+
+    payload = build_catalog(args.materials)
+    print(f"Danh mục giả: {args.materials} học liệu, "
+          f"{sum(len(m['files']) for m in payload['materials'])} file\n")
+
+    encoders = [
+        ("FastAPI mặc định (jsonable_encoder + json)", lambda: JSONResponse(jsonable_encoder(payload)).body),
+        ("ORJSONResponse", lambda: ORJSONResponse(payload).body)
+    ]
+    print(f"{'Mã hóa JSON':<46}{'trung vị':>12}{'nhỏ nhất':>12}{'bytes':>14}")
+    bodies = {}
+    for name, fn in encoders:
+        median, best, body = measure(fn, args.repeat)
+        bodies[name] = body
+        print(f"{name:<46}{median:>10.1f}ms{best:>10.1f}ms{len(body):>14,}")
+
+    body = bodies["ORJSONResponse"]
+    encodings = [("không nén", None), ("gzip", "gzip")]
+    if compression.brotli is not None:
+        encodings.append(("brotli", "br"))
+    else:
+        print("\n(chưa cài gói brotli: bỏ qua brotli)")
+
+    print(f"\n{'Nén body ORJSON':<46}{'trung vị':>12}{'nhỏ nhất':>12}{'bytes':>14}")
+    for name, encoding in encodings:
+        if encoding is None:
+            print(f"{name:<46}{'-':>12}{'-':>12}{len(body):>14,}")
+            continue
+        median, best, compressed = measure(lambda: compression.compress_bytes(body, encoding), args.repeat)
+        ratio = len(compressed) / len(body) * 100
+        print(f"{name:<46}{median:>10.1f}ms{best:>10.1f}ms{len(compressed):>14,}  ({ratio:.1f}%)")
+
+if __name__ == "__main__":
+    main()
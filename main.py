@@ -1,21 +1,32 @@
 from fastapi import FastAPI, Request, Depends
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from app.database.database import engine, get_db
+from fastapi.responses import RedirectResponse, ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.database import engine, async_engine, get_db, get_async_db
 from app.models import models
-from app.routes import auth, materials, users, dashboard
+from app.routes import auth, materials, users, dashboard, system
 from app.dependencies import get_optional_user, get_current_user
+from app.search_index import ensure_search_index, rebuild_search_index
+from app.jobs import job_runner
+from app.downloads import PrivateStaticFiles
+from app.compression import CompressionMiddleware
+from app import counters, daily_stats, reference_data
+from app.suggestions import suggestion_index
 import os
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Quản lý Học liệu Trường Sĩ quan Chính trị")
+app = FastAPI(
+    title="Quản lý Học liệu Trường Sĩ quan Chính trị",
+    default_response_class=ORJSONResponse
+)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Compress text/JSON responses above COMPRESSION_MIN_BYTES (brotli or gzip, see app/compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Mount static files (uploaded files are only served through /api/download, which checks login)
+app.mount("/static", PrivateStaticFiles(directory="app/static", private_dirs=("uploads",)), name="static")
 
 # Setup templates
 templates = Jinja2Templates(directory="app/templates")
@@ -24,13 +35,14 @@ templates = Jinja2Templates(directory="app/templates")
 app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(materials.router, prefix="/api", tags=["materials"])
 app.include_router(users.router, prefix="/api", tags=["users"])
+app.include_router(system.router, prefix="/api", tags=["system"])
 app.include_router(dashboard.router, tags=["dashboard"])  # Dashboard router already has /api prefix in routes
 
 # Routes
 @app.get("/")
 async def index(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user = Depends(get_optional_user)
 ):
     # Redirect to login if not authenticated
@@ -43,15 +55,15 @@ async def index(
 @app.get("/materials")
 async def materials_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user = Depends(get_optional_user)
 ):
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=302)
     
-    # Get all departments
-    departments = db.query(models.Department).all()
+    # Get all departments (cached, see app/reference_data.py)
+    departments = (await reference_data.departments.get(db)).rows
     
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -74,15 +86,15 @@ async def register_page(request: Request, user = Depends(get_optional_user)):
 @app.get("/detail")
 async def detail_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user = Depends(get_optional_user)
 ):
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=302)
     
-    # Get all departments for the detail page
-    departments = db.query(models.Department).all()
+    # Get all departments for the detail page (cached, see app/reference_data.py)
+    departments = (await reference_data.departments.get(db)).rows
     
     return templates.TemplateResponse("detail.html", {
         "request": request,
@@ -93,15 +105,15 @@ async def detail_page(
 @app.get("/dashboard")
 async def dashboard_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user = Depends(get_optional_user)
 ):
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=302)
     
-    # Get all departments
-    departments = db.query(models.Department).all()
+    # Get all departments (cached, see app/reference_data.py)
+    departments = (await reference_data.departments.get(db)).rows
     
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
@@ -112,15 +124,15 @@ async def dashboard_page(
 @app.get("/statistics")
 async def statistics_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user = Depends(get_optional_user)
 ):
     # Redirect to login if not authenticated
     if not user:
         return RedirectResponse(url="/login", status_code=302)
     
-    # Get all departments
-    departments = db.query(models.Department).all()
+    # Get all departments (cached, see app/reference_data.py)
+    departments = (await reference_data.departments.get(db)).rows
     
     return templates.TemplateResponse("statistics.html", {
         "request": request,
@@ -162,6 +174,14 @@ async def startup_event():
         db.commit()
         print("✅ Đã khởi tạo 14 khoa thành công")
     
+    # Reference data (departments) kept in memory for page renders
+    reference_data.load_all(db)
+    
+    # Create full-text search index (populate from existing materials on first run)
+    if ensure_search_index(db):
+        indexed = rebuild_search_index(db)
+        print(f"✅ Đã tạo chỉ mục tìm kiếm cho {indexed} học liệu")
+    
     # Create admin user if not exists
     admin_user = db.query(models.User).filter(models.User.username == "admin").first()
     
@@ -176,10 +196,33 @@ async def startup_event():
             role=models.UserRole.ADMIN
         )
         db.add(admin)
+        counters.user_created(db)
         db.commit()
         print("✅ Đã tạo tài khoản admin (username: admin, password: admin123)")
     
+    # Dashboard counters (computed from existing data on first run)
+    if not counters.has_counters(db):
+        total = counters.rebuild_counters(db)
+        print(f"✅ Đã tính bộ đếm thống kê cho {total} học liệu")
+    elif not daily_stats.has_rows(db) and counters.get_value(db, counters.MATERIALS):
+        # Database tạo trước khi có bảng thống kê theo ngày
+        total = daily_stats.rebuild(db)
+        counters.catalog_changed(db)
+        db.commit()
+        print(f"✅ Đã tổng hợp thống kê theo ngày cho {total} học liệu")
+    
+    # Search-box suggestions served from memory (kept current on commit)
+    suggestion_index.load(db)
+    
     db.close()
+    
+    # Background worker for text extraction / search indexing
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_runner.stop()
+    await async_engine.dispose()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,166 @@
+"""
+Các lệnh quản trị chạy từ dòng lệnh.
+
+Cách dùng:
+    python manage.py backfill-text          # Trích xuất nội dung các file đã upload
+    python manage.py rebuild-search-index   # Xây dựng lại chỉ mục tìm kiếm toàn văn
+    python manage.py rebuild-counters       # Tính lại bộ đếm thống kê dashboard
+    python manage.py backfill-daily-stats --from 2024-01-01 --to 2024-12-31
+                                            # Tính lại bảng thống kê theo ngày (bỏ --from/--to: toàn bộ)
+    python manage.py run-jobs               # Chạy worker xử lý hàng đợi (khi JOB_WORKERS=0)
+    python manage.py import-materials hoc-lieu.zip --uploader admin
+                                            # Nhập hàng loạt học liệu từ ZIP + manifest
+"""
+
+import argparse
+from datetime import date
+from app.database.database import SessionLocal, engine
+from app.models import models
+from app.storage import UPLOAD_DIR
+from app.jobs import JOB_WORKERS
+from app.material_import import IMPORT_BATCH_SIZE
+
+def backfill_text(args):
+    from app.text_store import backfill_upload_dir
+
+    print(f"🔄 Đang trích xuất nội dung file trong {args.upload_dir}...")
+    db = SessionLocal()
+    try:
+        result = backfill_upload_dir(db, args.upload_dir)
+    finally:
+        db.close()
+
+    print(f"✅ Đã quét {result['scanned']} file, cập nhật {result['updated']} file, "
+          f"xóa {result['removed']} bản ghi cũ")
+
+    # Nội dung file thay đổi thì chỉ mục toàn văn cũng phải cập nhật theo
+    rebuild_search_index(args)
+
+def rebuild_search_index(args):
+    from app.search_index import rebuild_search_index as rebuild
+
+    print("🔄 Đang xây dựng lại chỉ mục tìm kiếm...")
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+    finally:
+        db.close()
+
+    print(f"✅ Đã đánh chỉ mục {count} học liệu")
+
+def rebuild_counters(args):
+    from app.counters import rebuild_counters as rebuild
+
+    print("🔄 Đang tính lại bộ đếm thống kê...")
+    db = SessionLocal()
+    try:
+        total = rebuild(db)
+    finally:
+        db.close()
+
+    print(f"✅ Đã tính lại bộ đếm cho {total} học liệu")
+
+def backfill_daily_stats(args):
+    from app import counters, daily_stats
+
+    print("🔄 Đang tính lại bảng thống kê theo ngày...")
+    db = SessionLocal()
+    try:
+        total = daily_stats.rebuild(db, args.date_from, args.date_to)
+        counters.catalog_changed(db)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"✅ Đã tổng hợp {total} học liệu theo ngày")
+
+def run_jobs(args):
+    import asyncio
+    from app.jobs import JobRunner
+
+    async def run():
+        runner = JobRunner(workers=args.workers)
+        runner.start()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await runner.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("⏹️ Đã dừng worker")
+
+def import_materials(args):
+    import json
+    from app.material_import import import_archive, InvalidImport
+
+    db = SessionLocal()
+    try:
+        uploader = db.query(models.User).filter(models.User.username == args.uploader).first()
+    finally:
+        db.close()
+    if uploader is None:
+        raise SystemExit(f"❌ Không tìm thấy người dùng {args.uploader}")
+
+    manifest = None
+    if args.manifest:
+        with open(args.manifest, "rb") as f:
+            manifest = (f.read(), args.manifest)
+
+    print(f"🔄 Đang nhập học liệu từ {args.archive}...")
+    try:
+        with open(args.archive, "rb") as archive:
+            result = import_archive(archive, uploader.id, manifest, batch_size=args.batch_size)
+    except InvalidImport as e:
+        raise SystemExit(f"❌ {e.message}")
+
+    for row in result["rows"]:
+        if row["status"] == "error":
+            print(f"   Dòng {row['row']} ({row['file']}): {row['error']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Đã tạo {result['materials_created']} học liệu ({result['files_imported']} file), "
+          f"{result['errors']} dòng lỗi. Nội dung file được trích xuất ở nền (run-jobs hoặc web server).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Quản trị hệ thống học liệu")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill = subparsers.add_parser("backfill-text", help="Trích xuất nội dung các file đã upload")
+    backfill.add_argument("--upload-dir", default=UPLOAD_DIR)
+    backfill.set_defaults(func=backfill_text)
+
+    reindex = subparsers.add_parser("rebuild-search-index", help="Xây dựng lại chỉ mục tìm kiếm toàn văn")
+    reindex.set_defaults(func=rebuild_search_index)
+
+    counters = subparsers.add_parser("rebuild-counters", help="Tính lại bộ đếm thống kê dashboard")
+    counters.set_defaults(func=rebuild_counters)
+
+    daily = subparsers.add_parser("backfill-daily-stats", help="Tính lại bảng thống kê theo ngày (toàn bộ hoặc một khoảng ngày)")
+    daily.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Từ ngày (YYYY-MM-DD)")
+    daily.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Đến ngày (YYYY-MM-DD)")
+    daily.set_defaults(func=backfill_daily_stats)
+
+    jobs = subparsers.add_parser("run-jobs", help="Chạy worker xử lý hàng đợi công việc")
+    jobs.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    jobs.set_defaults(func=run_jobs)
+
+    importer = subparsers.add_parser("import-materials", help="Nhập hàng loạt học liệu từ ZIP + manifest CSV/JSON")
+    importer.add_argument("archive", help="File ZIP chứa các file học liệu")
+    importer.add_argument("--manifest", help="Manifest CSV/JSON (mặc định: manifest.csv / manifest.json trong ZIP)")
+    importer.add_argument("--uploader", default="admin", help="Tên đăng nhập của người đăng")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    importer.add_argument("--report", help="Ghi kết quả từng dòng ra file JSON")
+    importer.set_defaults(func=import_materials)
+
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,114 @@ Chạy script này khi server đang DỪNG
 """
 
 import sqlite3
+import hashlib
 import json
+import mimetypes
 import os
 
 DB_PATH = "hoclieu.db"
 
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def add_column_if_missing(cursor, table, column, definition):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        print(f"🔨 Thêm cột {table}.{column}...")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def rebuild_statistics():
+    """Tính lại bộ đếm dashboard và bảng thống kê theo ngày từ dữ liệu đã chuyển"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.models.models import StatCounter, MaterialDailyStat
+    from app.counters import rebuild_counters
+    
+    engine = create_engine(f"sqlite:///{DB_PATH}")
+    try:
+        # Database chưa từng chạy phiên bản mới: tạo trước hai bảng thống kê
+        StatCounter.metadata.create_all(engine, tables=[StatCounter.__table__, MaterialDailyStat.__table__])
+        with Session(engine) as db:
+            total = rebuild_counters(db)
+        print(f"✅ Đã tính lại bộ đếm và thống kê theo ngày cho {total} học liệu")
+    finally:
+        engine.dispose()
+
+def migrate_material_files(cursor):
+    """Chuyển danh sách file trong cột files_json sang bảng material_files"""
+    print("🔨 Tạo bảng material_files...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS material_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            material_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            file_type VARCHAR NOT NULL,
+            path VARCHAR NOT NULL,
+            original_name VARCHAR NOT NULL,
+            size INTEGER,
+            content_hash VARCHAR,
+            mime_type VARCHAR,
+            download_count INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME,
+            FOREIGN KEY(material_id) REFERENCES materials(id) ON DELETE CASCADE
+        )
+    """)
+    add_column_if_missing(cursor, "material_files", "download_count", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_material_files_id ON material_files (id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_material_files_material_id ON material_files (material_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_material_files_file_type ON material_files (file_type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_material_files_path ON material_files (path)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_material_files_content_hash ON material_files (content_hash)")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_material_files_material_position
+        ON material_files (material_id, position)
+    """)
+    
+    # Chỉ chuyển những học liệu chưa có dòng nào trong material_files
+    cursor.execute("""
+        SELECT id, files_json, created_at FROM materials
+        WHERE id NOT IN (SELECT DISTINCT material_id FROM material_files)
+    """)
+    pending = cursor.fetchall()
+    
+    print(f"📝 Đang chuyển {len(pending)} học liệu sang bảng material_files...")
+    file_count = 0
+    for material_id, files_json, created_at in pending:
+        for position, file_info in enumerate(json.loads(files_json or "[]")):
+            disk_path = file_info['path'].replace('/static/', 'app/static/', 1)
+            size = content_hash = None
+            if os.path.exists(disk_path):
+                size = os.path.getsize(disk_path)
+                content_hash = file_sha256(disk_path)
+            
+            cursor.execute("""
+                INSERT INTO material_files
+                (material_id, position, file_type, path, original_name, size, content_hash, mime_type,
+                 download_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+            """, (
+                material_id, position,
+                file_info.get('type') or "Tài liệu",
+                file_info['path'],
+                file_info.get('name') or os.path.basename(file_info['path']),
+                size, content_hash,
+                mimetypes.guess_type(file_info.get('name') or file_info['path'])[0],
+                created_at
+            ))
+            file_count += 1
+    
+    print(f"✅ Đã chuyển {file_count} file sang bảng material_files")
+    
+    # Bộ đếm theo loại file và thống kê theo ngày có thể đã được tính (lúc server khởi
+    # động) khi material_files còn trống: ghi các file vừa chuyển rồi tính lại
+    if file_count:
+        cursor.connection.commit()
+        rebuild_statistics()
+
 def migrate_database():
     if not os.path.exists(DB_PATH):
         print("❌ Không tìm thấy database. Vui lòng chạy server để tạo database mới.")
@@ -25,8 +128,9 @@ def migrate_database():
         columns = [row[1] for row in cursor.fetchall()]
         
         if 'files_json' in columns:
-            print("✅ Database đã được cập nhật. Không cần migration.")
-            conn.close()
+            print("✅ Bảng materials đã có cột files_json.")
+            migrate_material_files(cursor)
+            conn.commit()
             return
         
         print("📊 Đang sao lưu dữ liệu cũ...")
@@ -86,6 +190,8 @@ def migrate_database():
         cursor.execute("CREATE INDEX ix_materials_id ON materials (id)")
         cursor.execute("CREATE INDEX ix_materials_title ON materials (title)")
         
+        migrate_material_files(cursor)
+        
         conn.commit()
         print("✅ Migration hoàn thành!")
         print(f"✅ Đã chuyển đổi {len(old_materials)} học liệu sang format mới")
@@ -113,4 +219,7 @@ if __name__ == "__main__":
     print()
     print("=" * 60)
     print("✅ HOÀN THÀNH! Bạn có thể chạy lại server bây giờ.")
+    print("💡 Nên chạy: python manage.py backfill-text (trích xuất nội dung và cập nhật chỉ mục tìm kiếm)")
+    print("💡 Nếu số liệu thống kê chưa đúng: python manage.py rebuild-counters")
+    print("   và python manage.py backfill-daily-stats (thống kê theo ngày, theo loại file)")
     print("=" * 60)